@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+""" Benchmarks for the Conway's Game of Life engines
+
+Sweeps board size, live cell density and pattern, and reports cells/sec
+and peak memory for each engine. Results can be written as JSON lines, and
+compared against results from an earlier run:
+
+    python bench_conway.py --output before.jsonl
+    ... change things ...
+    python bench_conway.py --compare before.jsonl
+
+Peak memory is measured with tracemalloc in a separate run, so it doesn't
+slow the timings. It counts Python and numpy allocations in this process
+only, so it leaves out the workers and shared memory of the tiled engine.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import conway
+import conway_tiled
+import hashlife
+
+
+def _generator_engine(make_game):
+    # time n generations of a generator engine, after its setup and first
+    # generation
+    def run(board, generations):
+        with contextlib.closing(make_game(board)) as game:
+            next(game)
+            t0 = time.perf_counter()
+            for _ in itertools.islice(game, generations):
+                pass
+            return time.perf_counter() - t0
+    return run
+
+
+def _hashlife_engine(board, generations):
+    life = hashlife.HashLife(board)
+    t0 = time.perf_counter()
+    life.advance(generations)
+    return time.perf_counter() - t0
+
+
+# engine name -> (run(board, generations) -> seconds, largest board side)
+engines = {
+    "list": (_generator_engine(conway.game_of_life), 256),
+    "list_wraparound": (_generator_engine(conway.game_of_life_wraparound), 256),
+    "numpy": (_generator_engine(conway.game_of_life_numpy), None),
+    "numpy_wraparound": (_generator_engine(
+        lambda board: conway.game_of_life_numpy(board, wraparound=True)), None),
+    "numpy_packed": (_generator_engine(
+        lambda board: conway.game_of_life_numpy(board, packed=True)), None),
+    "sparse": (_generator_engine(conway.game_of_life_sparse), 1024),
+    "hashlife": (_hashlife_engine, 1024),
+    "tiled": (_generator_engine(conway_tiled.game_of_life_tiled), None),
+}
+
+
+def make_board(size, pattern, density, seed=0):
+    """Return size x size list-of-lists board of a random soup or a pattern"""
+    if pattern == "soup":
+        rng = np.random.default_rng(seed)
+        return (rng.random((size, size)) < density).astype(np.uint8).tolist()
+
+    cells = getattr(conway, pattern)
+    top = (size - len(cells)) // 2
+    left = (size - len(cells[0])) // 2
+    return conway.edgepad_board(cells, left=left, top=top,
+                                right=size - len(cells[0]) - left,
+                                bottom=size - len(cells) - top)
+
+
+def peak_memory(run, board, generations):
+    """Return peak bytes allocated while running an engine"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        run(board, generations)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cases(sizes, densities, patterns):
+    """Return generator of (size, pattern, density) to benchmark"""
+    for size in sizes:
+        for pattern in patterns:
+            if pattern == "soup":
+                for density in densities:
+                    yield size, pattern, density
+            else:
+                yield size, pattern, None
+
+
+def run_benchmarks(names, sizes, densities, patterns, generations, repeat):
+    """Return generator of result dicts, one per engine and case"""
+    meta = {
+        "commit": _git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    for size, pattern, density in cases(sizes, densities, patterns):
+        board = make_board(size, pattern, density)
+        for name in names:
+            run, max_side = engines[name]
+            if max_side is not None and size > max_side:
+                continue
+            seconds = min(run(board, generations) for _ in range(repeat))
+            yield dict(meta, engine=name, size=size, pattern=pattern,
+                       density=density, generations=generations,
+                       seconds=seconds,
+                       cells_per_sec=size * size * generations / seconds,
+                       peak_bytes=peak_memory(run, board, min(generations, 2)))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result):
+    return (result["engine"], result["size"], result["pattern"], result["density"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0].strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]))
+    parser.add_argument("--engines", nargs="+", choices=engines,
+                        default=[name for name in engines if name != "tiled"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[64, 256, 1024])
+    parser.add_argument("--densities", nargs="+", type=float, default=[0.01, 0.1, 0.5])
+    parser.add_argument("--patterns", nargs="+", default=["soup", "glider", "beacon"],
+                        choices=["soup", "glider", "beacon", "blinker"])
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="report the best of this many runs")
+    parser.add_argument("--output", help="write results to this file, as JSON lines")
+    parser.add_argument("--compare", help="JSON lines results to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {_key(r): r for r in map(json.loads, f)}
+
+    out = open(args.output, "w") if args.output else contextlib.nullcontext()
+    with out:
+        print(f"{'engine':18} {'size':>5} {'pattern':8} {'density':>7} "
+              f"{'cells/sec':>12} {'peak MB':>8}" + ("  vs base" if baseline else ""))
+        results = run_benchmarks(args.engines, args.sizes, args.densities,
+                                 args.patterns, args.generations, args.repeat)
+        for r in results:
+            if args.output:
+                out.write(json.dumps(r) + "\n")
+            line = (f"{r['engine']:18} {r['size']:5d} {r['pattern']:8} "
+                    f"{r['density'] if r['density'] is not None else '':>7} "
+                    f"{r['cells_per_sec']:12.3g} {r['peak_bytes'] / 2**20:8.1f}")
+            base = baseline.get(_key(r))
+            if base:
+                line += f"  {r['cells_per_sec'] / base['cells_per_sec']:6.2f}x"
+            print(line, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+""" Reading and writing Conway's Game of Life patterns
+
+Supports the two common text formats for Life patterns:
+
+* RLE (.rle), run-length encoded, e.g. the glider is ``bo$2bo$3o!``
+* plaintext (.cells), a grid of ``.`` (dead) and ``O`` (alive)
+
+and a bit-packed binary format that can be memory-mapped, so that huge
+boards can be opened without reading them into memory.
+
+Boards are read as numpy arrays, which feed directly into
+`conway.game_of_life_numpy`. Packed boards (see `conway.pack_board`) go in
+with the `ncols` argument:
+
+>>> import io
+>>> import conway
+>>> board, rule = read_rle(io.StringIO("x = 3, y = 3, rule = B3/S23\\nbo$2bo$3o!"))
+>>> board.tolist() == [row[1:4] for row in conway.glider[:3]]
+True
+>>> game = conway.game_of_life_numpy(board, rule=rule)
+"""
+import contextlib
+import os
+import re
+
+import numpy as np
+
+import conway
+
+PACKED_MAGIC = b"LIFEPACK"
+PACKED_HEADER_SIZE = 64         # magic, nrows, ncols, then padding
+
+
+def _opened(file, mode):
+    # open paths, pass through already open files
+    if isinstance(file, (str, os.PathLike)):
+        return open(file, mode)
+    return contextlib.nullcontext(file)
+
+
+## RLE
+
+def read_rle(file, packed=False):
+    """Return (board, rule) read from an RLE file or path
+
+    The board is a 2D uint8 array sized from the header line. It is filled
+    a row at a time as the file streams in; with `packed`, each row is
+    packed as it is finished, so the unpacked board is never in memory.
+    """
+    with _opened(file, "r") as f:
+        for line in f:
+            if not line.startswith("#") and line.strip():
+                break
+        else:
+            raise ValueError("RLE has no header line")
+        header = dict(re.findall(r"(\w+)\s*=\s*([^,\s]+)", line))
+        try:
+            ncols, nrows = int(header["x"]), int(header["y"])
+        except (KeyError, ValueError):
+            raise ValueError(f"bad RLE header: {line.strip()!r}")
+        rule = header.get("rule", conway.CONWAY)
+        conway.parse_rule(rule)  # validate
+
+        if packed:
+            board = np.zeros((nrows, -(-ncols // 8)), dtype=np.uint8)
+        else:
+            board = np.zeros((nrows, ncols), dtype=np.uint8)
+        row = np.zeros(ncols, dtype=np.uint8)
+        i = j = 0
+
+        def finish_row():
+            if i >= nrows:
+                raise ValueError("RLE pattern has more rows than its header")
+            board[i] = np.packbits(row, bitorder="little") if packed else row
+            row[:] = 0
+
+        count = ""              # counts can be split over lines
+        for line in f:
+            for digits, tag in re.findall(r"(\d+)|([^\d\s])", line):
+                if digits:
+                    count += digits
+                    continue
+                n = int(count or 1)
+                count = ""
+                if tag == "!":
+                    if j:
+                        finish_row()
+                    return board, rule
+                elif tag == "$":
+                    finish_row()
+                    i, j = i + n, 0
+                elif tag == "b":
+                    j += n
+                elif tag.isalpha():  # o, or a live state of a multi-state rule
+                    if j + n > ncols:
+                        raise ValueError("RLE pattern is wider than its header")
+                    row[j:j+n] = 1
+                    j += n
+                else:
+                    raise ValueError(f"bad RLE tag: {tag!r}")
+        raise ValueError("RLE pattern has no terminating '!'")
+
+
+def write_rle(board, file, rule=conway.CONWAY, width=70):
+    """Write board as RLE to a file or path, a row at a time"""
+    board = board if isinstance(board, np.ndarray) else np.array(board, dtype=np.uint8)
+    nrows, ncols = board.shape
+    with _opened(file, "w") as f:
+        f.write(f"x = {ncols}, y = {nrows}, rule = {rule}\n")
+        line = ""
+        pending_rows = 0        # '$' count waiting for the next live row
+
+        def emit(token):
+            nonlocal line
+            if len(line) + len(token) > width:
+                f.write(line + "\n")
+                line = ""
+            line += token
+
+        def run(n, tag):
+            return f"{n}{tag}" if n > 1 else tag
+
+        for row in board:
+            row = np.asarray(row, dtype=np.uint8)
+            if not row.any():
+                pending_rows += 1
+                continue
+            if pending_rows:
+                emit(run(pending_rows, "$"))
+            edges = np.flatnonzero(np.diff(row)) + 1
+            starts = np.concatenate(([0], edges))
+            ends = np.concatenate((edges, [ncols]))
+            for start, end in zip(starts, ends):
+                if row[start]:
+                    emit(run(end - start, "o"))
+                elif end < ncols:  # trailing dead cells are left out
+                    emit(run(end - start, "b"))
+            pending_rows = 1
+        emit("!")
+        f.write(line + "\n")
+
+
+## Plaintext
+
+def read_plaintext(file):
+    """Return board read from a plaintext (.cells) file or path"""
+    with _opened(file, "r") as f:
+        rows = [line.rstrip("\r\n").encode() for line in f
+                if not line.startswith("!")]
+    ncols = max((len(row) for row in rows), default=0)
+    board = np.zeros((len(rows), ncols), dtype=np.uint8)
+    for i, row in enumerate(rows):
+        chars = np.frombuffer(row, dtype=np.uint8)
+        board[i, :len(row)] = (chars == ord("O")) | (chars == ord("*"))
+    return board
+
+
+def write_plaintext(board, file):
+    """Write board as plaintext (.cells) to a file or path"""
+    with _opened(file, "w") as f:
+        for row in board:
+            f.write("".join("O" if bit else "." for bit in row) + "\n")
+
+
+## Packed binary
+
+def save_packed(board, path, ncols=None, chunk_rows=4096):
+    """Write board to path in the bit-packed binary format
+
+    The board is packed in chunks of rows, so it can itself be a
+    memory-mapped array. If `ncols` is given, the board is already packed,
+    as from `conway.pack_board` or `load_packed`.
+    """
+    nrows = len(board)
+    width = ncols if ncols is not None else len(board[0])
+    with open(path, "wb") as f:
+        header = PACKED_MAGIC + np.array([nrows, width], dtype="<u8").tobytes()
+        f.write(header.ljust(PACKED_HEADER_SIZE, b"\0"))
+        for lo in range(0, nrows, chunk_rows):
+            chunk = np.asarray(board[lo:lo+chunk_rows], dtype=np.uint8)
+            if ncols is None:
+                chunk = conway.pack_board(chunk)
+            f.write(np.ascontiguousarray(chunk).tobytes())
+
+
+def load_packed(path, mode="r"):
+    """Return (packed board, ncols), memory-mapped from a bit-packed file
+
+    Nothing is read until it is used. Pass both to
+    `conway.game_of_life_numpy(packed, ncols=ncols)` to run the board, or
+    to `conway.unpack_board` to unpack it.
+    """
+    with open(path, "rb") as f:
+        header = f.read(PACKED_HEADER_SIZE)
+    if not header.startswith(PACKED_MAGIC):
+        raise ValueError(f"{path} is not a packed Life board")
+    nrows, ncols = (int(n) for n in np.frombuffer(header, dtype="<u8", count=2,
+                                                    offset=len(PACKED_MAGIC)))
+    shape = (nrows, -(-ncols // 8))
+    if nrows * shape[1] == 0:
+        return np.zeros(shape, dtype=np.uint8), ncols
+    packed = np.memmap(path, dtype=np.uint8, mode=mode,
+                       offset=PACKED_HEADER_SIZE, shape=shape)
+    return packed, ncols
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+""" Conway's Game of Life, tiled across a pool of processes
+
+The board is split into horizontal strips, one per worker process. The
+current and next generations live in shared memory as boards with a 1-cell
+halo, so neighboring strips see each other's edge rows without copying, and
+each generation every worker writes its own strip of the next board.
+
+Run as a script for a scaling benchmark of generations/sec vs worker count.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import conway
+
+
+def game_of_life_tiled(initial=None, workers=None, wraparound=False,
+                       rule=conway.CONWAY):
+    """Return Conway's Game of Life generator, computed by worker processes
+
+    Edges are dead as in `game_of_life`, or wrap around as in
+    `game_of_life_wraparound`. Generations are yielded as 2D uint8 arrays,
+    like `conway.game_of_life_numpy`. The workers are shut down when the
+    generator is closed.
+    """
+    table = conway.compile_rule(rule)
+    if initial is None:
+        initial = [[0] * 5] * 5
+    board = np.array(initial, dtype=np.uint8)
+    nrows, ncols = board.shape
+    workers = min(workers or os.cpu_count(), nrows)
+    shape = (nrows + 2, ncols + 2)
+
+    shms = [shared_memory.SharedMemory(create=True, size=shape[0] * shape[1])
+            for _ in range(2)]
+    grids = []
+    procs = []
+    try:
+        grids = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in shms]
+        grids[0][:] = 0
+        grids[1][:] = 0
+        grids[0][1:-1, 1:-1] = board
+        if wraparound:
+            conway._wrap_halo(grids[0])
+
+        # each generation, main and workers meet at `start`, then again at
+        # `done` once every strip of the next board is written
+        start = mp.Barrier(workers + 1)
+        done = mp.Barrier(workers + 1)
+        stop = mp.Event()
+        bounds = [nrows * i // workers for i in range(workers + 1)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            p = mp.Process(target=_worker,
+                           args=([shm.name for shm in shms], shape, lo, hi,
+                                 wraparound, table, start, done, stop),
+                           daemon=True)
+            p.start()
+            procs.append(p)
+
+        gen = 0
+        while True:
+            yield grids[gen % 2][1:-1, 1:-1].copy()
+            start.wait()
+            done.wait()
+            gen += 1
+    finally:
+        if procs:
+            stop.set()
+            start.abort()       # release workers waiting for a generation
+            for p in procs:
+                p.join()
+        grids = None            # release the buffers before closing
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def _worker(names, shape, lo, hi, wraparound, table, start, done, stop):
+    shms = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        grids = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in shms]
+        _run_strip(grids, lo, hi, wraparound, table, start, done, stop)
+    except threading.BrokenBarrierError:
+        pass                    # main aborted, shutting down
+    except Exception:
+        done.abort()            # don't leave main waiting on a dead worker
+        raise
+    finally:
+        grids = None            # release the buffers before closing
+        for shm in shms:
+            shm.close()
+
+
+def _run_strip(grids, lo, hi, wraparound, table, start, done, stop):
+    # compute board rows lo:hi, which are rows lo+1:hi+1 of the grids
+    nrows = grids[0].shape[0] - 2
+    gen = 0
+    while True:
+        start.wait()
+        if stop.is_set():
+            return
+        src, dst = grids[gen % 2], grids[(gen + 1) % 2]
+        dst[lo+1:hi+1, 1:-1] = conway._step_padded(src[lo:hi+2], table)
+        if wraparound:
+            # refresh the halo cells that mirror this strip
+            dst[lo+1:hi+1, 0] = dst[lo+1:hi+1, -2]
+            dst[lo+1:hi+1, -1] = dst[lo+1:hi+1, 1]
+            if lo == 0:
+                dst[-1] = dst[1]
+            if hi == nrows:
+                dst[0] = dst[-2]
+        done.wait()
+        gen += 1
+
+
+def benchmark(size=2048, generations=20, max_workers=None, wraparound=False):
+    """Print generations/sec of game_of_life_tiled for each worker count"""
+    max_workers = max_workers or os.cpu_count()
+    board = np.random.randint(0, 2, (size, size), dtype=np.uint8)
+    print(f"{size}x{size} board, {generations} generations")
+    print("workers  gens/sec  speedup")
+    base = None
+    for workers in range(1, max_workers + 1):
+        game = game_of_life_tiled(board, workers, wraparound)
+        next(game)              # start up the pool outside the timing
+        t0 = time.perf_counter()
+        for _ in range(generations):
+            next(game)
+        rate = generations / (time.perf_counter() - t0)
+        game.close()
+        base = base or rate
+        print(f"{workers:7d}  {rate:8.1f}  {rate / base:7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0].strip())
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--wraparound", action="store_true")
+    args = parser.parse_args()
+    benchmark(args.size, args.generations, args.max_workers, args.wraparound)
@@ -1,7 +1,81 @@
-from collections import abc
+import bisect
+import weakref
+from collections import UserDict, abc
 from functools import reduce
 from itertools import chain
 
+
+class ObservableDict(UserDict):
+    """Dict that tells observers about changes, so caches can follow it
+
+    Every change bumps `version` and calls each observer as
+    callback(mapping, key, was_present) once it is made. Observers are
+    bound methods, held weakly, so observing a dict doesn't keep the
+    observer alive.
+
+    >>> d = ObservableDict(a=1)
+    >>> class Log:
+    ...     def changed(self, mapping, key, was_present):
+    ...         print(key, was_present, key in mapping)
+    >>> log = Log()
+    >>> d.observe(log.changed)
+    >>> d['a'] = 2
+    a True True
+    >>> d.update(b=3)
+    b False True
+    >>> del d['a']
+    a True False
+    >>> d.version
+    4
+
+    Observers are tied to live objects, so copies, pickles and deep copies
+    of the dict leave them behind:
+
+    >>> import copy, pickle
+    >>> pickle.loads(pickle.dumps(d))
+    {'b': 3}
+    >>> copy.deepcopy(d)['c'] = 4
+    """
+    def __init__(self, *args, **kwargs):
+        self.version = 0
+        self._observers = []    # weakref.WeakMethod of each callback
+        super().__init__(*args, **kwargs)
+
+    def observe(self, callback):
+        self._observers.append(weakref.WeakMethod(callback))
+
+    def __copy__(self):
+        # a copy is a new dict, with no observers of its own yet
+        return type(self)(self.data)
+
+    def copy(self):
+        return self.__copy__()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_observers"] = []
+        return state
+
+    def __setitem__(self, key, value):
+        was_present = key in self.data
+        self.data[key] = value
+        self._changed(key, was_present)
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self._changed(key, True)
+
+    def _changed(self, key, was_present):
+        self.version += 1
+        live = []
+        for ref in self._observers:
+            callback = ref()
+            if callback is not None:
+                callback(self, key, was_present)
+                live.append(ref)
+        self._observers = live
+
+
 class DictUnion(abc.Mapping):
     """Union of dictionaries, lazily combining values using binary function `fn`
 
@@ -83,30 +157,224 @@ class DictUnion(abc.Mapping):
     >>> DictUnion(dict_a, dict_b, dict_c, fn=list_concat, default=[])
     DictUnion({'a': [1, 1], 'b': [2, 4], 'c': [3, 3], 'd': [5]})
 
+
+    Left alone, every call recomputes: `keys`, and so `len` and
+    iteration, sort the union of the keys, and each lookup combines the
+    values afresh. With `cache`, the sorted keys and each combined value
+    are kept once computed. Changes to `ObservableDict`s in the union
+    invalidate only the keys they touch:
+
+    >>> layer = ObservableDict(dict_c)
+    >>> c = DictUnion(dict_a, layer, fn=operator.add, cache=True)
+    >>> c['b'], len(c)
+    (6, 4)
+    >>> layer['b'] = 10
+    >>> layer['e'] = 1
+    >>> c['b'], len(c)
+    (12, 5)
+
+    A copy of an `ObservableDict` starts with no observers, so changing it
+    leaves the union alone:
+
+    >>> snapshot = layer.copy()
+    >>> snapshot['f'] = 2
+    >>> len(c)
+    5
+
+    A pickled union follows the unpickled copies of its dicts:
+
+    >>> import pickle
+    >>> layer2, c2 = pickle.loads(pickle.dumps((layer, c)))
+    >>> layer2['g'] = 7
+    >>> len(c2), len(c)
+    (6, 5)
+
+    Plain dicts can't tell the union they changed, so call `invalidate`
+    after changing them:
+
+    >>> base = {'a': 1}
+    >>> c = DictUnion(base, layer, fn=operator.add, cache=True)
+    >>> c['a']
+    1
+    >>> base['a'] = 100
+    >>> c['a']
+    1
+    >>> c.invalidate('a')
+    >>> c['a']
+    100
+
+    A cached union also indexes which dicts hold each key, so a lookup
+    only touches the dicts that have it, not every dict in the union.
+
+    `get_many` looks up a batch of keys, with a default for missing ones:
+
+    >>> c.get_many(['a', 'b', 'z'], default=0)
+    [100, 10, 0]
+    >>> del layer['b']
+    >>> c.get_many(['b', 'e'])
+    [None, 1]
+    >>> a.get_many(['d', 'z'])
+    [5, None]
     """
-    def __init__(self, *dicts, fn, default=None):
+    def __init__(self, *dicts, fn, default=None, cache=False):
         self._dicts = dicts
         self._fn = fn
         self._default = default
+        self._cache = cache
+        if cache:
+            self._keys = None       # sorted keys, built on first use
+            self._values = {}       # map: key -> combined value
+            self._sources = None    # map: key -> positions of the dicts holding it
+            self._observe()
+
+    def _observe(self):
+        self._positions = {}    # map: id(dict) -> its positions in self._dicts
+        for i, d in enumerate(self._dicts):
+            if id(d) not in self._positions and isinstance(d, ObservableDict):
+                d.observe(self._changed)
+            self._positions.setdefault(id(d), []).append(i)
+
+    def __setstate__(self, state):
+        # unpickled dicts have new ids and have lost their observers
+        self.__dict__.update(state)
+        if self._cache:
+            self._observe()
 
     def keys(self):
-        return sorted(set(chain.from_iterable(self._dicts)))
+        if not self._cache:
+            return sorted(set(chain.from_iterable(self._dicts)))
+        return list(self._sorted_keys())
+
+    def invalidate(self, key=None):
+        """Drop cached results for key, or for every key
+
+        Only needed in cache mode, after changing a dict that isn't an
+        ObservableDict.
+        """
+        if not self._cache:
+            return
+        self._keys = None
+        if key is None:
+            self._values.clear()
+            self._sources = None
+            return
+        self._values.pop(key, None)
+        if self._sources is not None:
+            positions = [i for i, d in enumerate(self._dicts) if key in d]
+            if positions:
+                self._sources[key] = positions
+            else:
+                self._sources.pop(key, None)
+
+    def get_many(self, keys, default=None):
+        """Return list of the values of keys, with default for missing keys
+
+        Without `cache`, each dict is visited once for the whole batch, and
+        only the keys it shares with the batch are looked up in it: the
+        smaller of the two sides is scanned for hits in the other.
+        """
+        if self._cache:
+            values = self._values
+            missing = object()
+            result = []
+            for key in keys:
+                value = values.get(key, missing)
+                if value is missing:
+                    try:
+                        value = values[key] = self._combine(key)
+                    except KeyError:
+                        value = default
+                result.append(value)
+            return result
+
+        # one pass over each dict, collecting values for the keys it shares
+        keys = list(keys)
+        vals = {key: [] for key in keys}
+        for d in self._dicts:
+            if len(d) < len(vals):
+                shared = [key for key in d if key in vals]
+            else:
+                shared = [key for key in vals if key in d]
+            for key in shared:
+                vals[key].append(d[key])
+        return [self._reduce(vals[key]) if vals[key] else default for key in keys]
+
+    def _index(self):
+        if self._sources is None:
+            sources = {}
+            for i, d in enumerate(self._dicts):
+                for key in d:
+                    sources.setdefault(key, []).append(i)
+            self._sources = sources
+        return self._sources
+
+    def _sorted_keys(self):
+        if self._keys is None:
+            self._keys = sorted(self._index())
+        return self._keys
+
+    def _changed(self, mapping, key, was_present):
+        positions = self._positions.get(id(mapping))
+        if positions is None:
+            return              # not one of our dicts
+        self._values.pop(key, None)
+        present = key in mapping
+        if was_present == present:
+            return
+        if self._sources is None:
+            self._keys = None
+            return
+        # the key came into or left mapping: update its sources, and the
+        # keys if it is new to the union or gone from it
+        sources = self._sources.get(key)
+        if present:
+            if sources is None:
+                sources = self._sources[key] = []
+                self._keys = None
+            for i in positions:
+                bisect.insort(sources, i)
+        else:
+            for i in positions:
+                sources.remove(i)
+            if not sources:
+                del self._sources[key]
+                self._keys = None
 
     def __repr__(self):
         return f'{self.__class__.__name__}({dict(self)})'
 
     def __getitem__(self, key):
-        vals = [d[key] for d in self._dicts if key in d]
+        if self._cache:
+            try:
+                return self._values[key]
+            except KeyError:
+                pass
+            value = self._values[key] = self._combine(key)
+            return value
+        return self._combine(key)
+
+    def _combine(self, key):
+        if self._cache:
+            dicts = self._dicts
+            vals = [dicts[i][key] for i in self._index().get(key, ())]
+        else:
+            vals = [d[key] for d in self._dicts if key in d]
         if len(vals) == 0:
             raise KeyError(key)
+        return self._reduce(vals)
 
+    def _reduce(self, vals):
         if not self._default is None:
             return reduce(self._fn, vals, self._default)
         else:
             return reduce(self._fn, vals)
 
     def __iter__(self):
+        if self._cache:
+            return iter(self._sorted_keys())
         return iter(self.keys())
 
     def __len__(self):
+        if self._cache:
+            return len(self._sorted_keys())
         return len(self.keys())
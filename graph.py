@@ -1,22 +1,166 @@
+import bisect
+import math
+import sys
+import time
 import unittest
+from collections import deque
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from heap import IndexedHeap
+
+
+class CycleError(ValueError):
+    """Raised when a graph that must be acyclic has a cycle
+
+    `cycle` is the list of node keys on one cycle, in edge order: each has an
+    edge to the next, and the last to the first.
+    """
+    def __init__(self, cycle):
+        self.cycle = cycle
+        path = " -> ".join(str(key) for key in cycle + cycle[:1])
+        super().__init__(f"graph has a cycle: {path}")
+
+
+def _walk_cycle(start, parent):
+    # follow parent[] from start, which must lead into a cycle, and return
+    # the cycle in forward edge order
+    seen = {}
+    path = []
+    key = start
+    while key not in seen:
+        seen[key] = len(path)
+        path.append(key)
+        key = parent[key]
+    cycle = path[seen[key]:]
+    cycle.reverse()
+    return cycle
+
+
+## shortest paths, over any graph given as neighbors(u) -> iterable of
+## (v, weight) for each edge u -> v
+
+def _negative_weight(u, v, w):
+    raise ValueError(f"negative edge weight {w} from {u!r} to {v!r}")
+
+
+def _csr_neighbors(offsets, targets, weights):
+    # neighbors(u) over CSR id arrays, read through memoryviews
+    offsets = memoryview(offsets)
+    targets = memoryview(targets)
+    if weights is None:
+        return lambda u: ((v, 1) for v in targets[offsets[u]:offsets[u+1]])
+    weights = memoryview(weights)
+
+    def neighbors(u):
+        lo, hi = offsets[u], offsets[u+1]
+        return zip(targets[lo:hi], weights[lo:hi])
+    return neighbors
+
+
+def _dijkstra(source, neighbors, target=None, heuristic=None):
+    # (distance, parent) dicts, settling nodes in order of distance from
+    # source, or of distance + heuristic for A*, until target is settled.
+    # unsettled nodes may have tentative distances.
+    distance = {source: 0}
+    parent = {source: None}
+    queue = IndexedHeap()
+    queue.insert(source, heuristic(source) if heuristic else 0)
+    while len(queue):
+        u, _ = queue.pop()
+        if u == target:
+            break
+        du = distance[u]
+        for v, w in neighbors(u):
+            if w < 0:
+                _negative_weight(u, v, w)
+            d = du + w
+            if d < distance.get(v, math.inf):
+                distance[v] = d
+                parent[v] = u
+                priority = d + heuristic(v) if heuristic else d
+                if v in queue:
+                    queue.decrease_key(v, priority)
+                else:
+                    queue.insert(v, priority)  # or reopened, for A*
+    return distance, parent
+
+
+def _path(parent, target):
+    # keys on the path to target, from the parent map of a search
+    path = []
+    while target is not None:
+        path.append(target)
+        target = parent[target]
+    path.reverse()
+    return path
+
+
+def _bidirectional_dijkstra(source, target, neighbors, reverse_neighbors):
+    # (distance, path) from source to target, searching forward from source
+    # and backward from target, expanding the smaller queue each time,
+    # until the queue tops show no shorter path can meet
+    if source == target:
+        return 0, [source]
+    distance = ({source: 0}, {target: 0})
+    parent = ({source: None}, {target: None})
+    queue = (IndexedHeap(), IndexedHeap())
+    queue[0].insert(source, 0)
+    queue[1].insert(target, 0)
+    edges = (neighbors, reverse_neighbors)
+    best, meet = math.inf, None
+    while queue[0] and queue[1]:
+        if queue[0].peek()[1] + queue[1].peek()[1] >= best:
+            break
+        side = 0 if len(queue[0]) <= len(queue[1]) else 1
+        near, far = distance[side], distance[1 - side]
+        u, du = queue[side].pop()
+        for v, w in edges[side](u):
+            if w < 0:
+                _negative_weight(*((u, v) if side == 0 else (v, u)), w)
+            d = du + w
+            if d < near.get(v, math.inf):
+                near[v] = d
+                parent[side][v] = u
+                if v in queue[side]:
+                    queue[side].decrease_key(v, d)
+                else:
+                    queue[side].insert(v, d)
+            if v in far and d + far[v] < best:
+                best, meet = d + far[v], v
+
+    if meet is None:
+        return math.inf, []
+    path = _path(parent[0], meet)
+    path.extend(reversed(_path(parent[1], parent[1][meet])))
+    return best, path
+
 
 class Graph:
     def __init__(self):
         self.nodes = {}         # map: node key -> children
         # each node is a list of its edge partners
+        self.weights = {}       # map: node key -> weights of its edges, in order
+        # edges appended to `nodes` directly, without a weight, weigh 1
 
     def add_key(self, key):
         if key not in self.nodes:
             self.nodes[key] = []
+            self.weights[key] = []
 
-    def add_edge(self, u, v):
+    def add_edge(self, u, v, weight=1):
         self.add_key(u)
         self.add_key(v)
+        weights = self.weights.get(u)
+        if weights is None or len(weights) != len(self.nodes[u]):
+            weights = self.weights[u] = self._edge_weights(u)
         self.nodes[u].append(v)
+        weights.append(weight)
 
-    def add_undirected_edge(self, u, v):
-        self.add_edge(u, v)
-        self.add_edge(v, u)
+    def add_undirected_edge(self, u, v, weight=1):
+        self.add_edge(u, v, weight)
+        self.add_edge(v, u, weight)
 
     def has_key(self, key):
         return key in self.nodes
@@ -25,8 +169,7 @@ class Graph:
         return self.nodes.get(key, None)
 
     def __repr__(self):
-        res = [n for n in self.nodes]
-        return ",".join(res)
+        return ",".join(str(key) for key in self.nodes)
 
     def dfs(self, key, visited=None):
         if not self.has_key(key):
@@ -37,10 +180,59 @@ class Graph:
 
         visited.add(key)
         yield key
+        stack = [iter(self.nodes[key])]  # unscanned children of each node on the path
+        while stack:
+            for adj in stack[-1]:
+                if adj not in visited:
+                    visited.add(adj)
+                    yield adj
+                    stack.append(iter(self.nodes[adj]))
+                    break
+            else:
+                stack.pop()
 
-        for adj in self.adjacent_nodes(key):
-            if adj not in visited:
-                yield from self.dfs(adj, visited)
+    def dfs_events(self, source=None):
+        """Return generator of depth-first search events
+
+        Events are (kind, key) for kind "preorder" and "postorder", and
+        (kind, (u, v)) for each edge u -> v, with kind "tree", "back",
+        "forward" or "cross". Nodes are visited in the same order as `dfs`.
+        Without a source, every node is searched from, in insertion order.
+        """
+        if source is None:
+            roots = self.nodes
+        elif self.has_key(source):
+            roots = [source]
+        else:
+            return
+
+        preorder = {}           # map: key -> preorder number
+        finished = set()
+        for root in roots:
+            if root in preorder:
+                continue
+            preorder[root] = len(preorder)
+            yield "preorder", root
+            stack = [(root, iter(self.nodes[root]))]
+            while stack:
+                u, children = stack[-1]
+                for v in children:
+                    if v not in preorder:
+                        yield "tree", (u, v)
+                        preorder[v] = len(preorder)
+                        yield "preorder", v
+                        stack.append((v, iter(self.nodes[v])))
+                        break
+                    if v not in finished:
+                        yield "back", (u, v)
+                    elif preorder[v] > preorder[u]:
+                        yield "forward", (u, v)
+                    else:
+                        yield "cross", (u, v)
+                else:
+                    stack.pop()
+                    finished.add(u)
+                    yield "postorder", u
 
     def dfs_stack(self, source):
         stack = [source]
@@ -78,54 +270,935 @@ class Graph:
         return (reversed(postorder), visited)
 
     def topo_sort(self):
-        visited = set()
-        postorder = []
+        """Return list of node keys in topological order
 
-        def dfs_stack_postorder(source):
-            stack = [source]
-            while len(stack):
-                key = stack.pop()
-
-                if key not in visited:
-                    visited.add(key)
-                    adj = self.adjacent_nodes(key)
-                    if len(adj):
-                        stack.append(key)
-                        [stack.append(a) for a in adj if a not in visited]
-                    else:
-                        postorder.append(key)
-                else:
-                    postorder.append(key)
+        Raises `CycleError` if the graph has a cycle.
+        """
+        return [key for layer in self.topo_layers() for key in layer]
+
+    def topo_layers(self):
+        """Return generator of lists of node keys, in topological layers
+
+        Kahn's algorithm: the first layer is the nodes with no incoming
+        edges, and each later layer is the nodes whose parents are all in
+        earlier layers, so the nodes of a layer can be processed in
+        parallel. If the graph has a cycle, `CycleError` is raised after the
+        layers that could be completed.
+        """
+        indegree = dict.fromkeys(self.nodes, 0)
+        for adj in self.nodes.values():
+            for v in adj:
+                indegree[v] += 1
+
+        layer = [key for key, d in indegree.items() if d == 0]
+        done = 0
+        while layer:
+            yield layer
+            done += len(layer)
+            next_layer = []
+            for u in layer:
+                for v in self.nodes[u]:
+                    indegree[v] -= 1
+                    if indegree[v] == 0:
+                        next_layer.append(v)
+            layer = next_layer
 
-        for node in self.nodes:
-            if node not in visited:
-                dfs_stack_postorder(node)
-        yield from postorder
+        if done < len(self.nodes):
+            # every node left has a parent left, so walking back along
+            # parents must come round to a cycle
+            left = {key for key, d in indegree.items() if d}
+            parent = {}
+            for u in left:
+                for v in self.nodes[u]:
+                    if v in left:
+                        parent.setdefault(v, u)
+            raise CycleError(_walk_cycle(next(k for k in indegree if k in left), parent))
 
     def bfs(self, source):
-        queue = [source]
-        visited = set()
-        while len(queue):
-            key = queue.pop(0)
-            if key in visited:
-                continue
+        if not self.has_key(source):
+            return
 
-            visited.add(key)
+        queue = deque([source])
+        visited = {source}      # mark on enqueue, so each node is queued once
+        while queue:
+            key = queue.popleft()
             yield key
-            for adj in self.adjacent_nodes(key):
-                queue.append(adj)
+            for adj in self.nodes[key]:
+                if adj not in visited:
+                    visited.add(adj)
+                    queue.append(adj)
+
+    def bfs_levels(self, source):
+        """Return generator of lists of nodes at each distance from source
+
+        Nodes are in the same order as from `bfs`.
+        """
+        if not self.has_key(source):
+            return
+
+        frontier = [source]
+        visited = {source}
+        while frontier:
+            yield frontier
+            next_frontier = []
+            for key in frontier:
+                for adj in self.nodes[key]:
+                    if adj not in visited:
+                        visited.add(adj)
+                        next_frontier.append(adj)
+            frontier = next_frontier
+
+    def bfs_distances(self, source):
+        """Return (distance, parent) maps for the nodes reachable from source
+
+        distance is the number of edges on a shortest path from source, and
+        parent the previous node on that path (None for source).
+        """
+        distance, parent = {}, {}
+        if not self.has_key(source):
+            return distance, parent
+
+        distance[source], parent[source] = 0, None
+        queue = deque([source])
+        while queue:
+            key = queue.popleft()
+            d = distance[key] + 1
+            for adj in self.nodes[key]:
+                if adj not in distance:
+                    distance[adj], parent[adj] = d, key
+                    queue.append(adj)
+        return distance, parent
+
+    def to_csr(self):
+        """Return a frozen, compact CSRGraph copy of this graph"""
+        keys = list(self.nodes)
+        ids = {key: i for i, key in enumerate(keys)}
+        adjacency = self.nodes.values()
+
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, adjacency), dtype=np.int64, count=len(keys)),
+                  out=offsets[1:])
+        targets = np.fromiter((ids[v] for adj in adjacency for v in adj),
+                              dtype=_id_dtype(len(keys)), count=offsets[-1])
+        weights = np.fromiter((w for key in keys for w in self._edge_weights(key)),
+                              dtype=np.float64, count=offsets[-1])
+        if (weights == 1).all():
+            weights = None
+        return CSRGraph(keys, offsets, targets, weights)
+
+    def _edge_weights(self, key):
+        # weights of key's edges, parallel to nodes[key]
+        n = len(self.nodes[key])
+        weights = self.weights.get(key, [])
+        if len(weights) != n:
+            weights = weights[:n] + [1] * (n - len(weights))
+        return weights
+
+    def _neighbors(self, key):
+        return zip(self.nodes[key], self._edge_weights(key))
+
+    def _reverse_neighbors(self):
+        parents = {key: [] for key in self.nodes}
+        for u in self.nodes:
+            for v, w in self._neighbors(u):
+                parents[v].append((u, w))
+        return parents.__getitem__
+
+    def shortest_paths(self, source):
+        """Return (distance, parent) dicts of shortest paths from source
+
+        Dijkstra's algorithm, over edge weights, which must not be
+        negative. Like `bfs_distances`, only reachable nodes are included,
+        and the parent of source is None.
+        """
+        if not self.has_key(source):
+            return {}, {}
+        return _dijkstra(source, self._neighbors)
+
+    def shortest_path(self, source, target, heuristic=None, bidirectional=False):
+        """Return (distance, list of keys) of a shortest path from source to target
+
+        Dijkstra's algorithm, stopping once target is reached. With a
+        `heuristic(key)` giving a lower bound on the distance from key to
+        target, it is A*, which explores fewer nodes the tighter the bound.
+        With `bidirectional`, it searches from both ends at once, which
+        builds the reverse graph first; to run many queries, use
+        `to_csr().shortest_path`, which builds it once.
+
+        If target is not reachable, returns (math.inf, []). Raises
+        ValueError on negative edge weights.
+        """
+        if heuristic is not None and bidirectional:
+            raise ValueError("heuristic and bidirectional can't be combined")
+        if not (self.has_key(source) and self.has_key(target)):
+            return math.inf, []
+        if bidirectional:
+            return _bidirectional_dijkstra(source, target, self._neighbors,
+                                           self._reverse_neighbors())
+        distance, parent = _dijkstra(source, self._neighbors, target, heuristic)
+        if target not in distance:
+            return math.inf, []
+        return distance[target], _path(parent, target)
+
+    def strongly_connected_components(self):
+        """Return map: node key -> strongly connected component number
+
+        See `CSRGraph.strongly_connected_components`.
+        """
+        csr = self.to_csr()
+        return dict(zip(csr.keys, csr.strongly_connected_components().tolist()))
+
+    def condensation(self):
+        """Return (map: node key -> component number, condensed Graph)
+
+        See `CSRGraph.condensation`.
+        """
+        csr = self.to_csr()
+        labels, dag = csr.condensation()
+        return dict(zip(csr.keys, labels.tolist())), dag
+
+
+def _id_dtype(n):
+    # smallest integer type for node ids 0..n-1
+    return np.int32 if n < 2**31 else np.int64
+
+
+CSR_MAGIC = b"CSRGRAPH"
+CSR_HEADER_SIZE = 64            # magic, then the <u8 fields below, then padding
+_CSR_FIELDS = ("nodes", "edges", "id_size", "weighted", "int_keys", "blob_size")
+
+
+class _KeyTable(Sequence):
+    # map: id -> str node key, decoded on access from UTF-8 bytes, where key
+    # i is blob[offsets[i]:offsets[i+1]]
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = memoryview(blob)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i]:self._offsets[i+1]], "utf-8")
+
+    def __iter__(self):
+        bounds = self._offsets.tolist()
+        blob = self._blob
+        for lo, hi in zip(bounds, bounds[1:]):
+            yield str(blob[lo:hi], "utf-8")
+
+
+class _KeyIndex(Mapping):
+    # map: node key -> id, by binary search over the ids in key order, so it
+    # costs nothing to open
+    def __init__(self, keys, order, sorted_keys=None):
+        self._keys = keys
+        self._order = memoryview(order)
+        self._sorted_keys = sorted_keys  # for int keys, keys in order
+
+    def __getitem__(self, key):
+        n = len(self._order)
+        if self._sorted_keys is not None:
+            if isinstance(key, (int, np.integer)) and -2**63 <= key < 2**63:
+                i = int(np.searchsorted(self._sorted_keys, key))
+                if i < n and self._sorted_keys[i] == key:
+                    return self._order[i]
+        elif isinstance(key, str):
+            i = bisect.bisect_left(self._order, key, key=self._keys.__getitem__)
+            if i < n and self._keys[self._order[i]] == key:
+                return self._order[i]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class CSRGraph:
+    """Read-only graph stored in compressed sparse row (CSR) form
+
+    Node keys are interned to dense integer ids, and the children of node id
+    i are targets[offsets[i]:offsets[i+1]]. Ids and children keep the order
+    of the Graph they came from, so traversals visit nodes in the same order.
+    Edge weights are in `weights`, parallel to targets, or None if every
+    edge has weight 1.
+
+    A CSRGraph can be saved to a binary file, and opened again memory-mapped
+    in constant time, see `save` and `open`.
+    """
+    def __init__(self, keys, offsets, targets, weights=None, ids=None):
+        self.keys = keys        # map: id -> node key
+        if ids is None:
+            ids = {key: i for i, key in enumerate(keys)}
+        self.ids = ids          # map: node key -> id
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.path = None        # file the graph is mapped from, if any
+        self._reverse = None
+
+    def save(self, path):
+        """Write the graph to path in a binary format for `open`
+
+        Node keys must be all str or all int. Arrays are written in native
+        dtypes, aligned to 8 bytes: offsets, targets, weights if any, then
+        the key table, ids in key order for lookups, and for str keys the
+        UTF-8 key bytes.
+        """
+        n = len(self.keys)
+        keys = list(self.keys)
+        if all(isinstance(key, (int, np.integer)) for key in keys):
+            key_values = np.array(keys, dtype=np.int64)
+            order = np.argsort(key_values, kind="stable")
+            sections = [key_values, order.astype(_id_dtype(n)), key_values[order]]
+            blob = b""
+            int_keys = True
+        elif all(isinstance(key, str) for key in keys):
+            encoded = [key.encode() for key in keys]
+            key_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=n),
+                      out=key_offsets[1:])
+            order = sorted(range(n), key=keys.__getitem__)
+            sections = [key_offsets, np.array(order, dtype=_id_dtype(n))]
+            blob = b"".join(encoded)
+            int_keys = False
+        else:
+            raise TypeError("only graphs whose keys are all str or all int can be saved")
+
+        sections[:0] = [np.asarray(self.offsets, dtype=np.int64), self.targets]
+        if self.weights is not None:
+            sections.insert(2, np.asarray(self.weights, dtype=np.float64))
+        fields = (n, len(self.targets), self.targets.dtype.itemsize,
+                  self.weights is not None, int_keys, len(blob))
+        with open(path, "wb") as f:
+            header = CSR_MAGIC + np.array(fields, dtype="<u8").tobytes()
+            f.write(header.ljust(CSR_HEADER_SIZE, b"\0"))
+            for array in sections:
+                data = np.ascontiguousarray(array).tobytes()
+                f.write(data + b"\0" * (-len(data) % 8))
+            f.write(blob)
+
+    @classmethod
+    def open(cls, path):
+        """Return CSRGraph memory-mapped read-only from a file written by `save`
+
+        Nothing is read until it is used, and the pages are shared with
+        every other process that opens the same file. Node keys are decoded
+        on access, and looked up by binary search. Pickling the graph, as
+        to send it to a worker process, pickles just the path.
+        """
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        header = bytes(data[:CSR_HEADER_SIZE])
+        if not header.startswith(CSR_MAGIC):
+            raise ValueError(f"{path} is not a saved CSRGraph")
+        fields = np.frombuffer(header, dtype="<u8", count=len(_CSR_FIELDS),
+                               offset=len(CSR_MAGIC))
+        n, m, id_size, weighted, int_keys, blob_size = (int(x) for x in fields)
+        id_dtype = np.int32 if id_size == 4 else np.int64
+        pos = CSR_HEADER_SIZE
+
+        def section(dtype, count):
+            nonlocal pos
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+            pos += -(-array.nbytes // 8) * 8
+            return array
+
+        offsets = section(np.int64, n + 1)
+        targets = section(id_dtype, m)
+        weights = section(np.float64, m) if weighted else None
+        if int_keys:
+            keys = memoryview(section(np.int64, n))
+            order = section(_id_dtype(n), n)
+            ids = _KeyIndex(keys, order, section(np.int64, n))
+        else:
+            key_offsets = section(np.int64, n + 1)
+            order = section(_id_dtype(n), n)
+            keys = _KeyTable(memoryview(key_offsets), data[pos:pos + blob_size])
+            ids = _KeyIndex(keys, order)
+
+        graph = cls(keys, offsets, targets, weights, ids)
+        graph.path = path
+        return graph
+
+    def __reduce_ex__(self, protocol):
+        if self.path is not None:
+            return self.__class__.open, (self.path,)
+        return super().__reduce_ex__(protocol)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def has_key(self, key):
+        return key in self.ids
+
+    def adjacent_nodes(self, key):
+        i = self.ids.get(key)
+        if i is None:
+            return None
+        return [self.keys[j] for j in self.targets[self.offsets[i]:self.offsets[i+1]]]
+
+    def __repr__(self):
+        return ",".join(str(key) for key in self.keys)
+
+    def to_graph(self):
+        """Return a dict-based Graph copy of this graph"""
+        g = Graph()
+        keys = self.keys
+        targets = self.targets.tolist()
+        bounds = self.offsets.tolist()
+        weights = (self.weights.tolist() if self.weights is not None
+                   else [1] * len(targets))
+        for i, key in enumerate(keys):
+            lo, hi = bounds[i], bounds[i+1]
+            g.nodes[key] = [keys[j] for j in targets[lo:hi]]
+            g.weights[key] = weights[lo:hi]
+        return g
+
+    def _children(self, ids):
+        # (children, parents) for each edge out of the nodes in ids, in order
+        starts = self.offsets[ids]
+        counts = self.offsets[ids + 1] - starts
+        ends = np.cumsum(counts)
+        if not len(ends) or not ends[-1]:
+            return self.targets[:0], ids[:0]
+        index = np.arange(ends[-1]) + np.repeat(starts - (ends - counts), counts)
+        return self.targets[index], np.repeat(ids, counts)
+
+    def _frontiers(self, source):
+        # (node ids, parent ids) at each distance from source id, in queue order
+        visited = np.zeros(len(self.keys), dtype=bool)
+        frontier = np.array([source], dtype=self.targets.dtype)
+        parents = np.array([-1], dtype=self.targets.dtype)
+        visited[frontier] = True
+        while len(frontier):
+            yield frontier, parents
+
+            # unvisited children of the whole frontier, each at its first
+            # appearance, is the next frontier in queue order
+            children, parents = self._children(frontier)
+            new = ~visited[children]
+            children, parents = children[new], parents[new]
+            _, first = np.unique(children, return_index=True)
+            first.sort()
+            frontier, parents = children[first], parents[first]
+            visited[frontier] = True
+
+    def dfs(self, key):
+        if not self.has_key(key):
+            return
+        offsets = memoryview(self.offsets)
+        targets = memoryview(self.targets)
+        keys = self.keys
+        visited = bytearray(len(keys))
+
+        source = self.ids[key]
+        visited[source] = 1
+        yield keys[source]
+        stack = [[offsets[source], offsets[source+1]]]  # unscanned edges
+        while stack:
+            edges = stack[-1]
+            pos, end = edges
+            while pos < end and visited[targets[pos]]:
+                pos += 1
+            if pos == end:
+                stack.pop()
+                continue
+            edges[0] = pos + 1
+            v = targets[pos]
+            visited[v] = 1
+            yield keys[v]
+            stack.append([offsets[v], offsets[v+1]])
+
+    def bfs(self, source):
+        for level in self.bfs_levels(source):
+            yield from level
+
+    def bfs_levels(self, source):
+        """Return generator of lists of nodes at each distance from source"""
+        if not self.has_key(source):
+            return
+        keys = self.keys
+        for frontier, _ in self._frontiers(self.ids[source]):
+            yield [keys[i] for i in frontier.tolist()]
+
+    def bfs_distances(self, source):
+        """Return (distance, parent) arrays, indexed by node id
+
+        For nodes not reachable from source, distance and parent are -1. The
+        parent of source is also -1.
+        """
+        distance = np.full(len(self.keys), -1, dtype=np.int64)
+        parent = np.full(len(self.keys), -1, dtype=np.int64)
+        if self.has_key(source):
+            for d, (frontier, parents) in enumerate(self._frontiers(self.ids[source])):
+                distance[frontier] = d
+                parent[frontier] = parents
+        return distance, parent
 
+    def multi_source_bfs(self, sources):
+        """Return array of BFS distances from each of many source keys
+
+        Row i holds the distance from sources[i] to each node id, or -1 if
+        the node is unreachable. Sources are run 64 at a time, as the bits
+        of one uint64 per node, so each pass over the graph serves 64 of
+        them. Working memory is a few uint64 arrays of the node count, on
+        top of the len(sources) x len(self) int32 result.
+        """
+        ids = np.array([self.ids[key] for key in sources], dtype=self.targets.dtype)
+        distance = np.full((len(ids), len(self.keys)), -1, dtype=np.int32)
+        for lo in range(0, len(ids), 64):
+            for d, reached in self._bitset_levels(ids[lo:lo+64]):
+                nodes = np.flatnonzero(reached)
+                bits = reached[nodes]
+                for b in range(min(64, len(ids) - lo)):
+                    hit = (bits >> np.uint64(b)) & np.uint64(1) == 1
+                    distance[lo + b, nodes[hit]] = d
+        return distance
+
+    def multi_source_reachable(self, sources):
+        """Return generator of (source, set of reachable keys) for many sources
+
+        Like `multi_source_bfs`, runs 64 sources per pass, and holds only the
+        reachability bitsets of the current 64 in memory. `sources` may be
+        any iterable of keys.
+        """
+        sources = list(sources)
+        ids = np.array([self.ids[key] for key in sources], dtype=self.targets.dtype)
+        keys = self.keys
+        for lo in range(0, len(ids), 64):
+            visited = np.zeros(len(keys), dtype=np.uint64)
+            for _, reached in self._bitset_levels(ids[lo:lo+64]):
+                visited |= reached
+            for b, source in enumerate(sources[lo:lo+64]):
+                hit = (visited >> np.uint64(b)) & np.uint64(1) == 1
+                yield source, {keys[i] for i in np.flatnonzero(hit).tolist()}
+
+    def _bitset_levels(self, batch):
+        # for up to 64 source ids, bit b for sources[b], yield (distance,
+        # bitsets of the nodes first reached at that distance)
+        bits = np.left_shift(np.uint64(1), np.arange(len(batch), dtype=np.uint64))
+        frontier = np.zeros(len(self.keys), dtype=np.uint64)
+        np.bitwise_or.at(frontier, batch, bits)
+        visited = frontier.copy()
+        d = 0
+        while True:
+            yield d, frontier
+            active = np.flatnonzero(frontier).astype(self.targets.dtype)
+            children, parents = self._children(active)
+            reached = np.zeros_like(frontier)
+            np.bitwise_or.at(reached, children, frontier[parents])
+            frontier = reached & ~visited
+            if not frontier.any():
+                return
+            visited |= frontier
+            d += 1
+
+    def topo_sort(self):
+        """Return list of node keys in topological order
+
+        Raises `CycleError` if the graph has a cycle.
+        """
+        keys = self.keys
+        return [keys[i] for layer in self._topo_layers() for i in layer.tolist()]
+
+    def topo_layers(self):
+        """Return generator of lists of node keys, in topological layers
+
+        Like `Graph.topo_layers`, in the same order, with each layer
+        computed in a few array operations over an in-degree array.
+        """
+        keys = self.keys
+        for layer in self._topo_layers():
+            yield [keys[i] for i in layer.tolist()]
+
+    def _topo_layers(self):
+        indegree = np.bincount(self.targets, minlength=len(self.keys))
+        layer = np.flatnonzero(indegree == 0).astype(self.targets.dtype)
+        done = 0
+        while len(layer):
+            yield layer
+            done += len(layer)
+            children, _ = self._children(layer)
+            np.subtract.at(indegree, children, 1)
+            # children whose last parent was in this layer, in the order of
+            # their last edge from it, as Graph.topo_layers appends them
+            last = len(children) - 1 - np.unique(children[::-1], return_index=True)[1]
+            last = last[indegree[children[last]] == 0]
+            last.sort()
+            layer = children[last]
+
+        if done < len(self.keys):
+            left = indegree > 0
+            sources = np.repeat(np.arange(len(self.keys)), np.diff(self.offsets))
+            inner = left[sources] & left[self.targets]
+            parent = np.full(len(self.keys), -1)
+            # reversed, so that the first parent of each node wins
+            parent[self.targets[inner][::-1]] = sources[inner][::-1]
+            cycle = _walk_cycle(int(np.argmax(left)), parent.tolist())
+            raise CycleError([self.keys[i] for i in cycle])
+
+    def strongly_connected_components(self):
+        """Return array of strongly connected component numbers, by node id
+
+        Iterative Tarjan's algorithm, in linear time, with its bookkeeping
+        in flat arrays. Components are numbered in topological order of the
+        condensation: every edge between components goes from a lower
+        number to a higher one.
+        """
+        n = len(self.keys)
+        offsets = memoryview(self.offsets)
+        targets = memoryview(self.targets)
+        index_array = np.full(n, -1, dtype=np.int64)
+        low_array = np.zeros(n, dtype=np.int64)
+        label_array = np.zeros(n, dtype=np.int64)
+        index = memoryview(index_array)   # map: id -> preorder number
+        low = memoryview(low_array)       # map: id -> lowest preorder reached
+        label = memoryview(label_array)
+        on_stack = bytearray(n)
+        stack = []              # nodes not yet assigned a component
+        count = 0
+        components = 0
+
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = count
+            count += 1
+            stack.append(root)
+            on_stack[root] = 1
+            path = [[root, offsets[root]]]  # node, next edge to scan
+            while path:
+                frame = path[-1]
+                v, pos = frame
+                end = offsets[v+1]
+                while pos < end:
+                    w = targets[pos]
+                    pos += 1
+                    if index[w] < 0:
+                        break
+                    if on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                else:
+                    path.pop()
+                    if low[v] == index[v]:
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = 0
+                            label[w] = components
+                            if w == v:
+                                break
+                        components += 1
+                    if path:
+                        u = path[-1][0]
+                        if low[v] < low[u]:
+                            low[u] = low[v]
+                    continue
+                frame[1] = pos
+                index[w] = low[w] = count
+                count += 1
+                stack.append(w)
+                on_stack[w] = 1
+                path.append([w, offsets[w]])
+
+        # Tarjan finds components sinks first
+        return components - 1 - label_array
+
+    def condensation(self):
+        """Return (component numbers by node id, condensed Graph)
+
+        The condensed graph is a DAG with a node for each component number,
+        in order, and one edge for each pair of components joined by edges.
+        """
+        labels = self.strongly_connected_components()
+        components = int(labels.max()) + 1 if len(labels) else 0
+        sources = np.repeat(labels, np.diff(self.offsets))
+        targets = labels[self.targets]
+        between = sources != targets
+        pairs = np.unique(sources[between] * components + targets[between])
+
+        dag = Graph()
+        for c in range(components):
+            dag.add_key(c)
+        for u, v in zip(*divmod(pairs, components)):
+            dag.add_edge(int(u), int(v))
+        return labels, dag
+
+    def _check_weights(self):
+        if self.weights is not None and len(self.weights) and self.weights.min() < 0:
+            i = int(np.argmin(self.weights))
+            u = int(np.searchsorted(self.offsets, i, side="right")) - 1
+            _negative_weight(self.keys[u], self.keys[self.targets[i]], self.weights[i])
+
+    def _reverse_csr(self):
+        # (offsets, targets, weights) of the graph with every edge reversed,
+        # built on first use
+        if self._reverse is None:
+            n = len(self.keys)
+            sources = np.repeat(np.arange(n, dtype=self.targets.dtype),
+                                np.diff(self.offsets))
+            order = np.argsort(self.targets, kind="stable")
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=n), out=offsets[1:])
+            weights = self.weights[order] if self.weights is not None else None
+            self._reverse = (offsets, sources[order], weights)
+        return self._reverse
+
+    def shortest_paths(self, source):
+        """Return (distance, parent) arrays of shortest paths, indexed by node id
+
+        Dijkstra's algorithm, as `Graph.shortest_paths`. For nodes not
+        reachable from source, distance is inf and parent is -1. The parent
+        of source is also -1.
+        """
+        distance = np.full(len(self.keys), np.inf)
+        parent = np.full(len(self.keys), -1, dtype=np.int64)
+        if not self.has_key(source):
+            return distance, parent
+        self._check_weights()
+        neighbors = _csr_neighbors(self.offsets, self.targets, self.weights)
+        found, parents = _dijkstra(self.ids[source], neighbors)
+        distance[list(found)] = list(found.values())
+        del parents[self.ids[source]]
+        parent[list(parents)] = list(parents.values())
+        return distance, parent
+
+    def shortest_path(self, source, target, heuristic=None, bidirectional=False):
+        """Return (distance, list of keys) of a shortest path from source to target
+
+        As `Graph.shortest_path`. `heuristic` is called with node keys. The
+        reverse graph for `bidirectional` is built on the first such query
+        and kept.
+        """
+        if heuristic is not None and bidirectional:
+            raise ValueError("heuristic and bidirectional can't be combined")
+        if not (self.has_key(source) and self.has_key(target)):
+            return math.inf, []
+        self._check_weights()
+        keys = self.keys
+        s, t = self.ids[source], self.ids[target]
+        neighbors = _csr_neighbors(self.offsets, self.targets, self.weights)
+        if bidirectional:
+            d, path = _bidirectional_dijkstra(
+                s, t, neighbors, _csr_neighbors(*self._reverse_csr()))
+        else:
+            h = None if heuristic is None else lambda i: heuristic(keys[i])
+            distance, parent = _dijkstra(s, neighbors, t, h)
+            if t not in distance:
+                return math.inf, []
+            d, path = distance[t], _path(parent, t)
+        return d, [keys[i] for i in path]
+
+
+class TopoOrder:
+    """Topological order of a Graph, kept up to date as edges are added
+
+    Pearce and Kelly's dynamic algorithm: adding an edge u -> v that goes
+    against the current order only reorders the nodes between v and u in
+    the order that are reachable from v or reach u, instead of sorting the
+    whole graph again. Iterate over it for the nodes in order.
+    """
+    def __init__(self, graph=None):
+        self.graph = graph if graph is not None else Graph()
+        self._order = self.graph.topo_sort()  # map: position -> node key
+        self._position = {key: i for i, key in enumerate(self._order)}
+        self._parents = {key: [] for key in self.graph.nodes}
+        for u, adj in self.graph.nodes.items():
+            for v in adj:
+                self._parents[v].append(u)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def position(self, key):
+        return self._position[key]
+
+    def add_key(self, key):
+        if key not in self._position:
+            self.graph.add_key(key)
+            self._position[key] = len(self._order)
+            self._order.append(key)
+            self._parents[key] = []
+
+    def add_edge(self, u, v, weight=1):
+        """Add edge u -> v, of the given weight, to the graph, and update the order
+
+        Raises `CycleError`, and leaves the graph unchanged, if the edge
+        would close a cycle.
+        """
+        if u == v:
+            raise CycleError([u])
+        self.add_key(u)
+        self.add_key(v)
+        position = self._position
+        lower, upper = position[v], position[u]
+        if lower > upper:
+            pass                # already in order
+        else:
+            forward = self._search(v, self.graph.nodes, lambda p: p <= upper, u)
+            backward = self._search(u, self._parents, lambda p: p >= lower)
+            nodes = (sorted(backward, key=position.__getitem__) +
+                     sorted(forward, key=position.__getitem__))
+            for i, key in zip(sorted(position[key] for key in nodes), nodes):
+                position[key] = i
+                self._order[i] = key
+        self.graph.add_edge(u, v, weight)
+        self._parents[v].append(u)
+
+    def _search(self, source, edges, in_range, target=None):
+        # nodes reachable from source along edges, within the affected
+        # range of positions; reaching target means a cycle
+        parent = {source: None}
+        stack = [source]
+        while stack:
+            key = stack.pop()
+            for adj in edges[key]:
+                if adj == target:
+                    cycle = [adj]
+                    while key is not None:
+                        cycle.append(key)
+                        key = parent[key]
+                    cycle.reverse()
+                    raise CycleError(cycle)
+                if adj not in parent and in_range(self._position[adj]):
+                    parent[adj] = key
+                    stack.append(adj)
+        return parent
 
 
 def load_graph(file):
+    """Return Graph loaded from an edge list file of "u v" or "u v weight" lines"""
     g = Graph()
     with open(file) as f:
         for line in f:
             verts = line.strip().split(" ")
-            g.add_edge(verts[0], verts[1])
+            if len(verts) > 2:
+                g.add_edge(verts[0], verts[1], float(verts[2]))
+            else:
+                g.add_edge(verts[0], verts[1])
     return g
 
 
+def load_graph_bulk(file, csr=False, int_ids=False, chunk_size=2**24, verbose=False):
+    """Return graph loaded from an edge list file, in bulk
+
+    Like `load_graph`, but for big files: the file is read in large chunks,
+    and each chunk is split and interned in a few C-level passes. Each line
+    is an edge "u v", or "u v weight", separated by any whitespace; every
+    line must have the same number of columns. Blank lines and lines
+    starting with # or % are skipped. Returns a `CSRGraph` if `csr` is set,
+    and a `Graph` otherwise.
+
+    Node keys are strings, as from `load_graph`, or ints if `int_ids` is
+    set. With `verbose`, throughput is reported on stderr.
+    """
+    t0 = time.perf_counter()
+    ids = {}                    # map: node key -> id, by first appearance
+    chunks = []                 # arrays of interleaved u, v ids
+    weight_chunks = []
+    columns = None              # of every line, from the first
+
+    def parse(chunk):
+        nonlocal columns
+        if b"#" in chunk or b"%" in chunk:
+            chunk = b"\n".join(line for line in chunk.split(b"\n")
+                               if not line.lstrip().startswith((b"#", b"%")))
+        if not chunk.strip():
+            return
+        # count the tokens on each line, from the bytes that start a token
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        space = data <= ord(" ")
+        starts = ~space
+        starts[1:] &= space[:-1]
+        per_line = np.bincount(np.cumsum(data == ord("\n"))[starts])
+        per_line = per_line[per_line > 0]
+        if columns is None:
+            columns = int(per_line[0])
+        if columns not in (2, 3) or (per_line != columns).any():
+            raise ValueError(f"{file}: edge list lines must all have 2 or all have 3 columns")
+
+        tokens = chunk.split()
+        if columns == 3:
+            weight_chunks.append(np.array(tokens[2::3]).astype(np.float64))
+            del tokens[2::3]
+        if int_ids:
+            # numpy's text parser is several times faster than int() per token
+            text = chunk if columns == 2 else b" ".join(tokens)
+            try:
+                values = np.fromstring(text, dtype=np.int64, sep=" ")
+            except ValueError:
+                values = None
+            if values is None or len(values) != len(tokens):
+                raise ValueError(f"{file}: node ids must be integers")
+            # the parser clamps out-of-range ids to the int64 limits, so
+            # recheck any id that landed on one
+            info = np.iinfo(np.int64)
+            for i in np.flatnonzero((values == info.max) | (values == info.min)).tolist():
+                if int(tokens[i]) != values[i]:
+                    raise ValueError(f"{file}: node id {tokens[i].decode()} out of int64 range")
+            chunks.append(values)
+        else:
+            intern = ids.setdefault
+            chunks.append(np.array([intern(t, len(ids)) for t in tokens],
+                                   dtype=np.int64))
+
+    with open(file, "rb") as f:
+        tail = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = tail + chunk
+            cut = chunk.rfind(b"\n") + 1  # parse whole lines only
+            chunk, tail = chunk[:cut], chunk[cut:]
+            parse(chunk)
+        parse(tail)
+
+    edges = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    if int_ids:
+        values, first, edges = np.unique(edges, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        edges = rank[edges]
+        keys = values[order].tolist()
+    else:
+        keys = [key.decode() for key in ids]
+    src, dst = edges[0::2], edges[1::2]
+
+    # group edges by source, keeping file order within each source
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(keys)), out=offsets[1:])
+    order = np.argsort(src, kind="stable")
+    targets = dst[order].astype(_id_dtype(len(keys)))
+    weights = None
+    if weight_chunks:
+        weights = np.concatenate(weight_chunks)[order]
+        if (weights == 1).all():
+            weights = None
+    graph = CSRGraph(keys, offsets, targets, weights)
+    if not csr:
+        graph = graph.to_graph()
+
+    if verbose:
+        elapsed = time.perf_counter() - t0
+        print(f"{file}: {len(src)} edges, {len(keys)} nodes in {elapsed:.2f}s "
+              f"({len(src) / elapsed:,.0f} edges/sec)", file=sys.stderr)
+    return graph
+
+
 class TestGraph(unittest.TestCase):
     def test_add_key(self):
         g = Graph()
@@ -157,6 +1230,405 @@ class TestGraph(unittest.TestCase):
         expect = ["0", "1", "5", "4", "3", "2"]
         self.assertEqual(expect, actual)
 
+    def test_bfs_missing_source(self):
+        g = load_graph("medium_dg.txt")
+        self.assertEqual(list(g.bfs("missing")), [])
+        self.assertEqual(list(g.bfs_levels("missing")), [])
+
+    def test_bfs_levels(self):
+        g = load_graph("medium_dg.txt")
+        levels = list(g.bfs_levels("0"))
+        self.assertEqual(levels, [["0"], ["1", "5"], ["4"], ["3", "2"]])
+        self.assertEqual(list(g.to_csr().bfs_levels("0")), levels)
+
+    def test_bfs_distances(self):
+        g = load_graph("medium_dg.txt")
+        distance, parent = g.bfs_distances("0")
+        self.assertEqual(distance, {"0": 0, "1": 1, "5": 1, "4": 2, "3": 3, "2": 3})
+        self.assertEqual(parent, {"0": None, "1": "0", "5": "0", "4": "5", "3": "4", "2": "4"})
+
+        csr = g.to_csr()
+        csr_distance, csr_parent = csr.bfs_distances("0")
+        for key, i in csr.ids.items():
+            self.assertEqual(csr_distance[i], distance.get(key, -1))
+            expect = parent.get(key)
+            self.assertEqual(csr_parent[i], -1 if expect is None else csr.ids[expect])
+
+    def test_multi_source_bfs(self):
+        g = load_graph("medium_dg.txt")
+        csr = g.to_csr()
+        sources = list(g.nodes) * 6  # more than one batch of 64
+        distance = csr.multi_source_bfs(sources)
+        self.assertEqual(distance.shape, (len(sources), len(csr)))
+        for i, source in enumerate(sources):
+            expect, _ = csr.bfs_distances(source)
+            self.assertEqual(distance[i].tolist(), expect.tolist())
+
+        reachable = list(csr.multi_source_reachable(sources))
+        self.assertEqual([source for source, _ in reachable], sources)
+        for source, keys in reachable:
+            self.assertEqual(keys, set(g.bfs(source)))
+        reachable = dict(csr.multi_source_reachable(set(sources)))
+        self.assertEqual(reachable.keys(), set(sources))
+        for source, keys in reachable.items():
+            self.assertEqual(keys, set(g.bfs(source)))
+
+    def test_to_csr(self):
+        g = load_graph("medium_dg.txt")
+        csr = g.to_csr()
+        self.assertEqual(len(csr), len(g.nodes))
+        self.assertEqual(csr.num_edges, sum(len(adj) for adj in g.nodes.values()))
+        for key in g.nodes:
+            self.assertEqual(csr.adjacent_nodes(key), g.adjacent_nodes(key))
+        self.assertIsNone(csr.adjacent_nodes("missing"))
+
+    def test_csr_traversals(self):
+        g = load_graph("medium_dg.txt")
+        csr = g.to_csr()
+        for key in g.nodes:
+            self.assertEqual(list(csr.dfs(key)), list(g.dfs(key)))
+            self.assertEqual(list(csr.bfs(key)), list(g.bfs(key)))
+        self.assertEqual(list(csr.bfs("missing")), [])
+
+    def test_load_graph_bulk(self):
+        expect = load_graph("medium_dg.txt")
+        g = load_graph_bulk("medium_dg.txt")
+        self.assertEqual(g.nodes, expect.nodes)
+        self.assertEqual(list(g.nodes), list(expect.nodes))
+
+        csr = load_graph_bulk("medium_dg.txt", csr=True, chunk_size=7)
+        self.assertEqual(csr.keys, list(expect.nodes))
+        self.assertEqual(csr.to_graph().nodes, expect.nodes)
+
+    def test_load_graph_bulk_format(self):
+        import os
+        import tempfile
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("# comment\n10\t20\n\n% another\n20 30\n  10   30\n30 10")
+        self.addCleanup(os.remove, f.name)
+        g = load_graph_bulk(f.name, chunk_size=5)
+        self.assertEqual(g.nodes, {"10": ["20", "30"], "20": ["30"], "30": ["10"]})
+        csr = load_graph_bulk(f.name, csr=True, int_ids=True)
+        self.assertEqual(csr.keys, [10, 20, 30])
+        self.assertEqual(csr.adjacent_nodes(10), [20, 30])
+
+    def test_load_graph_bulk_columns(self):
+        import os
+        import tempfile
+
+        def load(text, **kwargs):
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+                f.write(text)
+            self.addCleanup(os.remove, f.name)
+            return load_graph_bulk(f.name, **kwargs)
+
+        g = load("a b 1.5\nc d 2\na d 0.25\n", chunk_size=7)
+        self.assertEqual(g.nodes, {"a": ["b", "d"], "b": [], "c": ["d"], "d": []})
+        self.assertEqual(g.weights, {"a": [1.5, 0.25], "b": [], "c": [2.0], "d": []})
+        csr = load("1 2 3\n2 1 4\n", csr=True, int_ids=True)
+        self.assertEqual(csr.weights.tolist(), [3.0, 4.0])
+        for text in ["a b 1.5\nc d\n", "a\nb c d\n", "a b c d\n", "a b\n" * 10 + "c\n"]:
+            with self.assertRaises(ValueError):
+                load(text, chunk_size=4)
+        for text in ["1 2\n3 x\n", "1 2\n3 4.5\n"]:
+            with self.assertRaisesRegex(ValueError, "must be integers"):
+                load(text, int_ids=True)
+        for text in ["1 2\n3 99999999999999999999\n", "-99999999999999999999 1\n"]:
+            with self.assertRaisesRegex(ValueError, "out of int64 range"):
+                load(text, int_ids=True)
+        big = np.iinfo(np.int64).max
+        csr = load(f"{big} 1\n", csr=True, int_ids=True)
+        self.assertEqual(csr.keys, [big, 1])
+
+    def test_dfs_deep(self):
+        g = Graph()
+        n = 10 * sys.getrecursionlimit()
+        for i in range(n):
+            g.add_edge(i, i + 1)
+        self.assertEqual(list(g.dfs(0)), list(range(n + 1)))
+        self.assertEqual(list(g.topo_sort()), list(range(n + 1)))
+
+    def test_dfs_events(self):
+        g = Graph()
+        for u, v in [("A", "B"), ("B", "C"), ("C", "A"), ("A", "C"), ("D", "C")]:
+            g.add_edge(u, v)
+        self.assertEqual(list(g.dfs_events()), [
+            ("preorder", "A"), ("tree", ("A", "B")),
+            ("preorder", "B"), ("tree", ("B", "C")),
+            ("preorder", "C"), ("back", ("C", "A")), ("postorder", "C"),
+            ("postorder", "B"), ("forward", ("A", "C")), ("postorder", "A"),
+            ("preorder", "D"), ("cross", ("D", "C")), ("postorder", "D"),
+        ])
+        self.assertEqual(list(g.dfs_events("missing")), [])
+
+        g = load_graph("medium_dg.txt")
+        for key in g.nodes:
+            preorder = [k for kind, k in g.dfs_events(key) if kind == "preorder"]
+            self.assertEqual(preorder, list(g.dfs(key)))
+
+    def test_topo_sort(self):
+        g = load_graph("topo_dg.txt")
+        order = list(g.topo_sort())
+        self.assertEqual(sorted(order), sorted(g.nodes))
+        position = {key: i for i, key in enumerate(order)}
+        for u, adj in g.nodes.items():
+            for v in adj:
+                self.assertLess(position[u], position[v])
+        self.assertEqual(list(g.to_csr().topo_sort()), order)
+
+    def assertCycle(self, g, cycle):
+        self.assertTrue(cycle)
+        for u, v in zip(cycle, cycle[1:] + cycle[:1]):
+            self.assertIn(v, g.adjacent_nodes(u))
+
+    def test_topo_layers(self):
+        g = load_graph("topo_dg.txt")
+        layers = list(g.topo_layers())
+        self.assertEqual(layers[0], ["2", "8"])
+        layer_of = {key: i for i, layer in enumerate(layers) for key in layer}
+        self.assertEqual(len(layer_of), len(g.nodes))
+        for u, adj in g.nodes.items():
+            for v in adj:
+                self.assertLess(layer_of[u], layer_of[v])
+        self.assertEqual(list(g.to_csr().topo_layers()), layers)
+
+    def test_topo_sort_cycle(self):
+        g = load_graph("topo_dg.txt")
+        g.add_edge("4", "14")
+        g.add_edge("14", "7")
+        g.add_edge("7", "15")
+        for graph in (g, g.to_csr()):
+            with self.assertRaises(CycleError) as cm:
+                graph.topo_sort()
+            self.assertCycle(g, cm.exception.cycle)
+            self.assertEqual(sorted(cm.exception.cycle), ["14", "4", "6", "7"])
+
+    def test_topo_order(self):
+        import random
+        rng = random.Random(0)
+        order = TopoOrder(load_graph("topo_dg.txt"))
+        g = order.graph
+        for _ in range(300):
+            u, v = rng.randrange(20), rng.randrange(20)
+            n = sum(map(len, g.nodes.values()))
+            try:
+                order.add_edge(u, v)
+            except CycleError as e:
+                self.assertEqual(sum(map(len, g.nodes.values())), n)
+                g.add_edge(u, v)
+                self.assertCycle(g, e.cycle)
+                g.nodes[u].pop()
+                g.weights[u].pop()
+                continue
+            self.assertEqual(sorted(order, key=str), sorted(g.nodes, key=str))
+            for x, adj in g.nodes.items():
+                for y in adj:
+                    self.assertLess(order.position(x), order.position(y))
+
+        # a self-loop is rejected before its key is added
+        order = TopoOrder()
+        with self.assertRaises(CycleError):
+            order.add_edge("X", "X")
+        self.assertEqual(list(order), [])
+        self.assertEqual(order.graph.nodes, {})
+
+    def test_strongly_connected_components(self):
+        g = load_graph("medium_dg.txt")
+        components = g.strongly_connected_components()
+        self.assertEqual(components.keys(), g.nodes.keys())
+
+        # same component iff mutually reachable
+        reach = {key: set(g.bfs(key)) for key in g.nodes}
+        for u in g.nodes:
+            for v in g.nodes:
+                self.assertEqual(components[u] == components[v],
+                                 v in reach[u] and u in reach[v])
+
+        labels, dag = g.condensation()
+        self.assertEqual(labels, components)
+        self.assertEqual(list(dag.nodes), list(range(len(set(labels.values())))))
+        self.assertEqual(dag.topo_sort(), list(dag.nodes))
+        expect = {(labels[u], labels[v]) for u, adj in g.nodes.items() for v in adj
+                  if labels[u] != labels[v]}
+        self.assertEqual({(u, v) for u, adj in dag.nodes.items() for v in adj}, expect)
+        self.assertEqual(sum(map(len, dag.nodes.values())), len(expect))
+        self.assertEqual(repr(dag), ",".join(map(str, dag.nodes)))
+
+    def test_strongly_connected_components_deep(self):
+        g = Graph()
+        n = 10 * sys.getrecursionlimit()
+        for i in range(n):
+            g.add_edge(i, i + 1)
+        g.add_edge(n, n // 2)
+        components = g.strongly_connected_components()
+        self.assertEqual(len(set(components.values())), n // 2 + 1)
+        self.assertEqual(components[n], components[n // 2])
+
+    def random_weighted_graph(self, n, m, seed=0):
+        import random
+        rng = random.Random(seed)
+        g = Graph()
+        for i in range(n):
+            g.add_key(i)
+        for _ in range(m):
+            g.add_edge(rng.randrange(n), rng.randrange(n), rng.randint(0, 20))
+        return g
+
+    def bellman_ford(self, g, source):
+        distance = {source: 0}
+        for _ in range(len(g.nodes)):
+            for u in list(distance):
+                for v, w in zip(g.nodes[u], g.weights[u]):
+                    if distance[u] + w < distance.get(v, math.inf):
+                        distance[v] = distance[u] + w
+        return distance
+
+    def assertPath(self, g, path, distance):
+        self.assertEqual(sum(min(w for x, w in zip(g.nodes[u], g.weights[u]) if x == v)
+                             for u, v in zip(path, path[1:])), distance)
+
+    def test_weighted_edges(self):
+        g = Graph()
+        g.add_edge("A", "B", 2.5)
+        g.add_undirected_edge("B", "C", 3)
+        g.add_edge("C", "A")
+        self.assertEqual(g.weights, {"A": [2.5], "B": [3], "C": [3, 1]})
+        csr = g.to_csr()
+        self.assertEqual(csr.weights.tolist(), [2.5, 3, 3, 1])
+        self.assertEqual(csr.to_graph().weights, g.weights)
+        self.assertIsNone(load_graph("medium_dg.txt").to_csr().weights)
+
+        # edges appended to nodes directly weigh 1
+        g.nodes["C"].append("D")
+        g.nodes["D"] = ["A"]
+        self.assertEqual(g.shortest_path("A", "D"), (6.5, ["A", "B", "C", "D"]))
+        self.assertEqual(g.to_csr().weights.tolist(), [2.5, 3, 3, 1, 1, 1])
+        self.assertEqual(len(set(g.strongly_connected_components().values())), 1)
+        g.add_edge("D", "B", 5)
+        self.assertEqual(g.weights["D"], [1, 5])
+
+        order = TopoOrder()
+        order.add_edge("A", "B", 2.5)
+        self.assertEqual(order.graph.weights, {"A": [2.5], "B": []})
+
+    def test_shortest_paths(self):
+        g = self.random_weighted_graph(60, 200)
+        csr = g.to_csr()
+        for source in range(0, 60, 7):
+            expect = self.bellman_ford(g, source)
+            distance, parent = g.shortest_paths(source)
+            self.assertEqual(distance, expect)
+            self.assertIsNone(parent[source])
+            for v, u in parent.items():
+                if u is not None:
+                    self.assertEqual(distance[v], min(
+                        distance[u] + w for x, w in zip(g.nodes[u], g.weights[u]) if x == v))
+
+            csr_distance, csr_parent = csr.shortest_paths(source)
+            for key, i in csr.ids.items():
+                self.assertEqual(csr_distance[i], expect.get(key, math.inf))
+            self.assertEqual(csr_parent[csr.ids[source]], -1)
+
+            for target in range(60):
+                for graph in (g, csr):
+                    for kwargs in ({}, {"heuristic": lambda key: 0},
+                                   {"bidirectional": True}):
+                        d, path = graph.shortest_path(source, target, **kwargs)
+                        self.assertEqual(d, expect.get(target, math.inf))
+                        if target in expect:
+                            self.assertEqual((path[0], path[-1]), (source, target))
+                            self.assertPath(g, path, d)
+                        else:
+                            self.assertEqual(path, [])
+
+    def test_astar_grid(self):
+        g = Graph()
+        n = 30
+        for i in range(n):
+            for j in range(n):
+                if i + 1 < n:
+                    g.add_undirected_edge((i, j), (i + 1, j), 1 + (i * j) % 3)
+                if j + 1 < n:
+                    g.add_undirected_edge((i, j), (i, j + 1), 1 + (i + j) % 2)
+        target = (n - 1, n - 1)
+
+        def manhattan(key):
+            return abs(key[0] - target[0]) + abs(key[1] - target[1])
+        expect = g.shortest_paths((0, 0))[0][target]
+        for graph in (g, g.to_csr()):
+            d, path = graph.shortest_path((0, 0), target, heuristic=manhattan)
+            self.assertEqual(d, expect)
+            self.assertPath(g, path, d)
+
+    def test_shortest_path_errors(self):
+        g = Graph()
+        g.add_edge("A", "B", -1)
+        for graph in (g, g.to_csr()):
+            with self.assertRaises(ValueError):
+                graph.shortest_path("A", "B")
+            with self.assertRaises(ValueError):
+                graph.shortest_path("A", "B", bidirectional=True)
+            with self.assertRaises(ValueError):
+                graph.shortest_path("A", "B", heuristic=len, bidirectional=True)
+            self.assertEqual(graph.shortest_path("A", "missing"), (math.inf, []))
+
+    def test_csr_save_open(self):
+        import os
+        import pickle
+        import tempfile
+        fd, path = tempfile.mkstemp(suffix=".csr")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        g = load_graph("medium_dg.txt")
+        g.add_edge("ünïcode", "0", 2.5)
+        csr = g.to_csr()
+        csr.save(path)
+        mapped = CSRGraph.open(path)
+        self.assertEqual(len(mapped), len(csr))
+        self.assertEqual(list(mapped.keys), csr.keys)
+        self.assertEqual(dict(mapped.ids), csr.ids)
+        self.assertNotIn("missing", mapped.ids)
+        self.assertNotIn(0, mapped.ids)
+        self.assertEqual(mapped.to_graph().nodes, g.nodes)
+        self.assertEqual(mapped.to_graph().weights, g.weights)
+        for key in g.nodes:
+            self.assertEqual(list(mapped.dfs(key)), list(g.dfs(key)))
+            self.assertEqual(list(mapped.bfs(key)), list(g.bfs(key)))
+            self.assertEqual(mapped.shortest_path("ünïcode", key), g.shortest_path("ünïcode", key))
+
+        reopened = pickle.loads(pickle.dumps(mapped))
+        self.assertEqual(reopened.path, path)
+        self.assertEqual(reopened.adjacent_nodes("4"), g.adjacent_nodes("4"))
+        self.assertEqual(pickle.loads(pickle.dumps(csr)).ids, csr.ids)
+
+        csr = load_graph_bulk("medium_dg.txt", csr=True, int_ids=True)
+        csr.save(path)
+        mapped = CSRGraph.open(path)
+        self.assertIsNone(mapped.weights)
+        self.assertEqual(list(mapped.keys), csr.keys)
+        self.assertEqual(dict(mapped.ids), csr.ids)
+        self.assertNotIn("0", mapped.ids)
+        self.assertEqual(list(mapped.bfs(0)), list(csr.bfs(0)))
+        self.assertEqual(mapped.adjacent_nodes(4), csr.adjacent_nodes(4))
+
+        with self.assertRaises(TypeError):
+            g.add_edge(1, "0")
+            g.to_csr().save(path)
+        with open(path, "wb") as f:
+            f.write(b"not a graph" * 10)
+        with self.assertRaises(ValueError):
+            CSRGraph.open(path)
+
+    def test_csr_topo_sort(self):
+        g = load_graph("topo_dg.txt")
+        order = list(g.to_csr().topo_sort())
+        self.assertEqual(sorted(order), sorted(g.nodes))
+        position = {key: i for i, key in enumerate(order)}
+        for u, adj in g.nodes.items():
+            for v in adj:
+                self.assertLess(position[u], position[v])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+""" Hashlife: Conway's Game of Life on a memoized quadtree
+
+Gosper's algorithm. The plane is a quadtree whose nodes are hash-consed, so
+identical squares anywhere in the pattern, or at any generation, are the
+same node. The future of each node is memoized, and because a node of level
+k can be advanced 2^(k-2) generations at once, regular patterns can be
+leapt ahead by huge numbers of generations.
+
+Unlike `conway.game_of_life`, the plane is unbounded: cells beyond the
+edges of a board are dead, but patterns are free to grow past them.
+
+>>> import conway
+>>> life = HashLife(conway.glider)
+>>> life.advance(4)
+>>> moved = [row[:6] for row in conway.edgepad_board(conway.glider)[:6]]
+>>> life.to_board() == moved
+True
+"""
+import conway
+
+
+class Node:
+    """Quadtree node for a 2^level x 2^level square of cells
+
+    Nodes are canonical; make them with `HashLife.join`, never directly, so
+    that equal squares are the same object and can be hashed by identity.
+    Level 0 nodes are single cells.
+    """
+    __slots__ = ("nw", "ne", "sw", "se", "level", "population")
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.level = level
+        self.population = population
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(level={self.level}, population={self.population})'
+
+
+class HashLife:
+    """Hashlife universe, started from a list-of-lists board
+
+    Board cell (i, j) is at row i, column j of the plane. The universe owns
+    its node table and memoized results; once the table grows beyond
+    `max_nodes`, nodes not reachable from the current pattern are garbage
+    collected between steps. As with `conway.game_of_life_sparse`, `rule`
+    can't have birth on 0 neighbors.
+    """
+    def __init__(self, board=None, max_nodes=1_000_000, rule=conway.CONWAY):
+        self._table = conway.compile_rule(rule)
+        conway._check_unbounded(self._table, rule)
+        self.max_nodes = max_nodes
+        self.generation = 0
+        self._nodes = {}        # map: (nw, ne, sw, se) -> canonical node
+        self._results = {}      # map: (node, j) -> center after 2^j generations
+        self._dead = Node(None, None, None, None, 0, 0)
+        self._alive = Node(None, None, None, None, 0, 1)
+        self._empty = [self._dead]  # empty node of each level
+
+        if board is None:
+            board = [[0]]
+        self._shape = (len(board), len(board[0]))
+        cells = [(i, j)
+                 for i, row in enumerate(board)
+                 for j, bit in enumerate(row) if bit]
+        level = 3
+        while 2 ** (level - 1) < max(self._shape):
+            level += 1
+        half = 2 ** (level - 1)
+        self.root = self._build(cells, level, -half, -half)
+
+    @property
+    def population(self):
+        return self.root.population
+
+    def __len__(self):
+        return len(self._nodes)
+
+    ## node construction
+
+    def join(self, nw, ne, sw, se):
+        """Return the canonical node with the given quadrants"""
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            population = (nw.population + ne.population +
+                          sw.population + se.population)
+            node = Node(nw, ne, sw, se, nw.level + 1, population)
+            self._nodes[key] = node
+        return node
+
+    def empty(self, level):
+        """Return the canonical empty node of the given level"""
+        while len(self._empty) <= level:
+            e = self._empty[-1]
+            self._empty.append(self.join(e, e, e, e))
+        return self._empty[level]
+
+    def _build(self, cells, level, top, left):
+        # node for the square at (top, left) holding the given live cells
+        if not cells:
+            return self.empty(level)
+        if level == 0:
+            return self._alive
+
+        half = 2 ** (level - 1)
+        quads = [[], [], [], []]
+        for i, j in cells:
+            quads[2 * (i >= top + half) + (j >= left + half)].append((i, j))
+        nw, ne, sw, se = quads
+        return self.join(self._build(nw, level - 1, top, left),
+                         self._build(ne, level - 1, top, left + half),
+                         self._build(sw, level - 1, top + half, left),
+                         self._build(se, level - 1, top + half, left + half))
+
+    def _centre(self, node):
+        # node of the next level up, with node in the middle
+        e = self.empty(node.level - 1)
+        return self.join(self.join(e, e, e, node.nw),
+                         self.join(e, e, node.ne, e),
+                         self.join(e, node.sw, e, e),
+                         self.join(node.se, e, e, e))
+
+    def _inner(self, node):
+        # node of the next level down, from the middle of node
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _is_padded(self, node):
+        # all live cells are in the middle quarter (by width) of node
+        return (node.level >= 3 and
+                node.nw.population == node.nw.se.se.population and
+                node.ne.population == node.ne.sw.sw.population and
+                node.sw.population == node.sw.ne.ne.population and
+                node.se.population == node.se.nw.nw.population)
+
+    ## evolution
+
+    def _life_4x4(self, node):
+        # center 2x2 of a level 2 node, one generation on
+        grid = [[0] * 4 for _ in range(4)]
+        for qi, quad in enumerate((node.nw, node.ne, node.sw, node.se)):
+            for ci, cell in enumerate((quad.nw, quad.ne, quad.sw, quad.se)):
+                i = 2 * (qi // 2) + ci // 2
+                j = 2 * (qi % 2) + ci % 2
+                grid[i][j] = cell.population
+
+        def next_cell(i, j):
+            count = sum(grid[x][y]
+                        for x in (i-1, i, i+1)
+                        for y in (j-1, j, j+1)) - grid[i][j]
+            return self._alive if self._table[grid[i][j]][count] else self._dead
+
+        return self.join(next_cell(1, 1), next_cell(1, 2),
+                         next_cell(2, 1), next_cell(2, 2))
+
+    def successor(self, node, j):
+        """Return the center half of node, 2^j generations on
+
+        j can be at most node.level - 2, the furthest the center can be
+        advanced knowing only the cells in node.
+        """
+        j = min(j, node.level - 2)
+        key = (node, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+
+        if node.population == 0:
+            result = node.nw
+        elif node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            join = self.join
+            # advance nine overlapping subsquares of half size, then the
+            # four quadrants they make up. a full step (j == level - 2) is
+            # split in two halves between them, a shorter one is done
+            # entirely on the subsquares.
+            half_j = j if j < node.level - 2 else j - 1
+            c = [self.successor(sq, half_j) for sq in (
+                nw,
+                join(nw.ne, ne.nw, nw.se, ne.sw),
+                ne,
+                join(nw.sw, nw.se, sw.nw, sw.ne),
+                join(nw.se, ne.sw, sw.ne, se.nw),
+                join(ne.sw, ne.se, se.nw, se.ne),
+                sw,
+                join(sw.ne, se.nw, sw.se, se.sw),
+                se)]
+            quads = (join(c[0], c[1], c[3], c[4]), join(c[1], c[2], c[4], c[5]),
+                     join(c[3], c[4], c[6], c[7]), join(c[4], c[5], c[7], c[8]))
+            if j < node.level - 2:
+                result = join(*(self._inner(q) for q in quads))
+            else:
+                result = join(*(self.successor(q, half_j) for q in quads))
+
+        self._results[key] = result
+        return result
+
+    def step(self, k):
+        """Advance the universe by 2^k generations"""
+        root = self.root
+        while root.level < k + 2 or not self._is_padded(root):
+            root = self._centre(root)
+        root = self.successor(self._centre(root), k)
+
+        # shrink back down while the pattern fits
+        while root.level > 3 and self._is_padded(root):
+            root = self._inner(root)
+        self.root = root
+        self.generation += 2 ** k
+
+        if len(self._nodes) > self.max_nodes:
+            self.collect()
+
+    def advance(self, generations):
+        """Advance the universe by any number of generations"""
+        k = 0
+        while generations:
+            if generations & 1:
+                self.step(k)
+            generations >>= 1
+            k += 1
+
+    def collect(self):
+        """Drop nodes and results not reachable from the current pattern"""
+        live = {}
+        stack = [self.root] + self._empty
+        while stack:
+            node = stack.pop()
+            if node.level == 0 or id(node) in live:
+                continue
+            live[id(node)] = node
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+
+        self._nodes = {(n.nw, n.ne, n.sw, n.se): n for n in live.values()}
+        self._results = {(node, j): result
+                         for (node, j), result in self._results.items()
+                         if id(node) in live and
+                         (result.level == 0 or id(result) in live)}
+
+    ## conversion
+
+    def cells(self):
+        """Return generator of (row, col) for each live cell"""
+        half = 2 ** (self.root.level - 1)
+        stack = [(self.root, -half, -half)]
+        while stack:
+            node, top, left = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                yield top, left
+                continue
+            h = 2 ** (node.level - 1)
+            stack.extend(((node.se, top + h, left + h), (node.sw, top + h, left),
+                          (node.ne, top, left + h), (node.nw, top, left)))
+
+    def to_board(self, top=0, left=0, height=None, width=None):
+        """Return list-of-lists board for a window of the plane
+
+        The default window is where the initial board was.
+        """
+        if height is None:
+            height = self._shape[0]
+        if width is None:
+            width = self._shape[1]
+        board = [[0] * width for _ in range(height)]
+        for i, j in self.cells():
+            if top <= i < top + height and left <= j < left + width:
+                board[i - top][j - left] = 1
+        return board
@@ -1,34 +1,136 @@
+import asyncio
+import heapq
+import itertools
+import queue
+import threading
+import time
 import unittest
+from array import array
+from collections import deque
+
+import numpy as np
+
+
+class _Reversed:
+    # heap entry that orders by key, largest first, and by seq, smallest
+    # first, among equal keys: the reverse=True fallback for keys that
+    # can't be negated, at the cost of a Python-level __lt__ per comparison
+    __slots__ = ("key", "seq", "item")
+
+    def __init__(self, key, item, seq=0):
+        self.key = key
+        self.seq = seq
+        self.item = item
+
+    def __lt__(self, other):
+        if other.key < self.key:
+            return True
+        return self.seq < other.seq and not self.key < other.key
+
 
 class Heap:
-    def __init__(self):
-        self._heap = [None]     # don't use self._heap[0], makes arithmetic easier
+    """Priority queue, smallest item first
+
+    With `key`, items are ordered by key(item), computed once as each item
+    goes in. With `reverse`, the largest comes out first. Either way,
+    equal keys come out in insertion order.
+
+    With `reverse`, numeric keys are stored negated, so comparisons stay in
+    C. Keys that can't be negated, such as strings, are wrapped in an
+    object with a reversed __lt__, which is several times slower. The first
+    key to go in picks the scheme for the life of the heap.
+
+    Subclasses can instead order items by overriding `compare`, at the
+    cost of a method call per comparison. Otherwise, the heap runs on the
+    C `heapq` functions.
+    """
+    def __init__(self, key=None, reverse=False):
+        self._heap = []
+        self._fast = type(self).compare is Heap.compare
+        self._count = count = itertools.count()  # ties come out in insertion order
+        self._key = key
+        if reverse:
+            self._decorate = self._decorate_first_reversed
+        elif key:
+            self._decorate = lambda item: (key(item), next(count), item)
+            self._undecorate = lambda entry: entry[2]
+        else:
+            self._decorate = self._undecorate = None
+
+    def _decorate_first_reversed(self, item):
+        # pick the reverse scheme from the first key, then decorate with it
+        key, count = self._key, self._count
+        k = key(item) if key else item
+        try:
+            entry = (-k, next(count), item)
+        except TypeError:
+            if key:
+                self._decorate = lambda item: _Reversed(key(item), item, next(count))
+            else:
+                self._decorate = lambda item: _Reversed(item, item, next(count))
+            self._undecorate = lambda entry: entry.item
+            return self._decorate(item)
+        if key:
+            self._decorate = lambda item: (-key(item), next(count), item)
+        else:
+            self._decorate = lambda item: (-item, next(count), item)
+        self._undecorate = lambda entry: entry[2]
+        return entry
+
+    @classmethod
+    def from_iterable(cls, iterable, key=None, reverse=False):
+        """Return a heap of the items of iterable, built in O(n)
+
+        Rather than n inserts, the items are put in place as they come, then
+        sunk from the last parent up to the root, which is O(n) overall.
+        """
+        h = cls(key=key, reverse=reverse)
+        if h._decorate is None:
+            h._heap.extend(iterable)
+        else:
+            # _decorate may replace itself after the first item
+            h._heap.extend(h._decorate(item) for item in iterable)
+        if h._fast:
+            heapq.heapify(h._heap)
+        else:
+            for i in range(len(h) // 2 - 1, -1, -1):
+                h._sink(i)
+        return h
 
     def __len__(self):
-        return len(self._heap) - 1
+        return len(self._heap)
 
     def __getitem__(self, index):
-        return self._heap[index+1]
+        entry = self._heap[index]
+        return entry if self._undecorate is None else self._undecorate(entry)
 
-    def insert(self, key):
-        self._heap.append(key)
-        self._swim(len(self))
+    def insert(self, item):
+        if self._decorate is not None:
+            item = self._decorate(item)
+        if self._fast:
+            heapq.heappush(self._heap, item)
+        else:
+            self._heap.append(item)
+            self._swim(len(self._heap) - 1)
 
     def pop(self):
-        if not len(self): return None
         h = self._heap
-        maxV = h[1]
-        h[1], h[-1] = h[-1], h[1]
-        self._heap = self._heap[:-1]         # chop last value
-        self._sink(1)
-        return maxV
+        if not h: return None
+        if self._fast:
+            entry = heapq.heappop(h)
+        else:
+            h[0], h[-1] = h[-1], h[0]
+            entry = h.pop()     # chop last value, in place
+            if h:
+                self._sink(0)
+        return entry if self._undecorate is None else self._undecorate(entry)
 
     def _sink(self, i):
         h = self._heap
-        N = len(self)
-        while (2*i <= N):
-            j = 2*i
-            if (j < N and not self.compare(j, j+1)):
+        N = len(h)
+        while (2*i + 1 < N):
+            j = 2*i + 1
+            if (j + 1 < N and not self.compare(j, j+1)):
                 j += 1
             if self.compare(i, j):
                 break
@@ -38,20 +140,21 @@ class Heap:
 
     def _swim(self, i):
         h = self._heap
-        while (i > 1):
+        while (i > 0):
             j = self._parent(i)
-            if self.compare(i, j):
-                h[j], h[i] = h[i], h[j]
+            if not self.compare(i, j):
+                break
+            h[j], h[i] = h[i], h[j]
             i = j
 
     def _parent(self, i):
-        return i // 2
+        return (i - 1) // 2
 
     def _leftchild(self, i):
-        return 2*i
+        return 2*i + 1
 
     def _rightchild(self, i):
-        return 2*i + 1
+        return 2*i + 2
 
     def compare(self, a, b):
         # by arbitrary default, Heap is a min priority queue
@@ -61,6 +164,439 @@ class Heap:
         while len(self):
             yield self.pop()
 
+
+class IndexedHeap:
+    """Min priority queue of distinct items, with decrease-key
+
+    Each item is inserted with a priority, and items come out lowest
+    priority first. The position of every item in the heap is tracked, so
+    an item's priority can be changed, or the item removed, in place in
+    O(log n), rather than pushing duplicates and skipping stale ones.
+    Membership is O(1).
+    """
+    def __init__(self):
+        self._heap = [None]     # [priority, item], from 1 to keep the arithmetic simple
+        self._index = {}        # map: item -> position in self._heap
+
+    def __len__(self):
+        return len(self._heap) - 1
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def priority(self, item):
+        return self._heap[self._index[item]][0]
+
+    def insert(self, item, priority):
+        if item in self._index:
+            raise KeyError(f"{item!r} is already in the heap")
+        self._heap.append([priority, item])
+        self._swim(len(self._heap) - 1)
+
+    def peek(self):
+        """Return (item, priority) with the lowest priority, or None"""
+        if len(self._heap) == 1: return None
+        priority, item = self._heap[1]
+        return item, priority
+
+    def pop(self):
+        """Remove and return (item, priority) with the lowest priority, or None"""
+        h = self._heap
+        if len(h) == 1: return None
+        priority, item = h[1]
+        last = h.pop()
+        del self._index[item]
+        if len(h) > 1:
+            h[1] = last
+            self._sink(1)
+        return item, priority
+
+    def decrease_key(self, item, priority):
+        """Lower the priority of item already in the heap"""
+        i = self._index[item]
+        entry = self._heap[i]
+        if priority > entry[0]:
+            raise ValueError(f"can't increase priority of {item!r} with decrease_key")
+        entry[0] = priority
+        self._swim(i)
+
+    def increase_key(self, item, priority):
+        """Raise the priority of item already in the heap"""
+        i = self._index[item]
+        entry = self._heap[i]
+        if priority < entry[0]:
+            raise ValueError(f"can't decrease priority of {item!r} with increase_key")
+        entry[0] = priority
+        self._sink(i)
+
+    def update(self, item, priority):
+        """Set the priority of item, inserting it if it isn't in the heap"""
+        i = self._index.get(item)
+        if i is None:
+            self.insert(item, priority)
+            return
+        self._heap[i][0] = priority
+        self._sink(i)           # which swims it back up if need be
+
+    def remove(self, item):
+        """Remove item from the heap, and return its priority"""
+        h = self._heap
+        i = self._index.pop(item)
+        priority = h[i][0]
+        last = h.pop()
+        if i < len(h):
+            h[i] = last
+            self._sink(i)
+        return priority
+
+    def __iter__(self):
+        while len(self._heap) > 1:
+            yield self.pop()
+
+    def _sink(self, i):
+        # move the entry at i down to its place. like heapq, shift the
+        # smaller child up all the way to a leaf, then swim the entry back
+        # up from there: it usually belongs near the bottom, so this takes
+        # about half the comparisons of stopping on the way down
+        h = self._heap
+        index = self._index
+        N = len(h) - 1
+        entry = h[i]
+        j = 2*i
+        while j <= N:
+            if j < N and h[j+1][0] < h[j][0]:
+                j += 1
+            h[i] = h[j]
+            index[h[i][1]] = i
+            i = j
+            j = 2*i
+        h[i] = entry
+        self._swim(i)
+
+    def _swim(self, i):
+        # move the entry at i up to its place, shifting larger parents down
+        h = self._heap
+        index = self._index
+        entry = h[i]
+        priority = entry[0]
+        while i > 1:
+            parent = h[i >> 1]
+            if not priority < parent[0]:
+                break
+            h[i] = parent
+            index[parent[1]] = i
+            i >>= 1
+        h[i] = entry
+        index[entry[1]] = i
+
+
+class NumericHeap:
+    """Min heap of (priority, value) pairs, float priorities and int values
+
+    The pairs are stored unboxed, in an array('d') of priorities and a
+    parallel array('q') of values, 16 bytes per entry against over 100 for
+    a tuple in a list. `push_many` and `pop_many` move whole batches
+    through numpy.
+    """
+    def __init__(self):
+        self._priority = array('d')
+        self._value = array('q')
+
+    def __len__(self):
+        return len(self._priority)
+
+    def insert(self, priority, value=0):
+        self._priority.append(priority)
+        self._value.append(value)
+        self._swim(len(self._priority) - 1)
+
+    def pop(self):
+        """Remove and return (priority, value) with the lowest priority, or None"""
+        p, v = self._priority, self._value
+        if not p: return None
+        top = p[0], v[0]
+        priority, value = p.pop(), v.pop()
+        if p:
+            p[0], v[0] = priority, value
+            self._sink(0)
+        return top
+
+    def push_many(self, priorities, values=None):
+        """Insert a batch of priorities, with values (default 0)
+
+        A batch that is large next to the heap is added by sorting
+        everything in numpy, since a sorted array is a valid heap; a small
+        one is inserted one at a time.
+        """
+        priorities = np.asarray(priorities, dtype=np.float64)
+        values = (np.zeros(len(priorities), dtype=np.int64) if values is None
+                  else np.asarray(values, dtype=np.int64))
+        if len(priorities) != len(values):
+            raise ValueError("priorities and values must be the same length")
+        if len(priorities) * 16 < len(self):
+            for priority, value in zip(priorities.tolist(), values.tolist()):
+                self.insert(priority, value)
+            return
+        old_priorities, old_values = self._arrays()
+        priorities = np.concatenate((old_priorities, priorities))
+        values = np.concatenate((old_values, values))
+        order = np.argsort(priorities, kind="stable")
+        self._set_sorted(priorities[order], values[order])
+
+    def pop_many(self, k):
+        """Remove and return (priorities, values) arrays of the k lowest, in order
+
+        Fewer are returned if the heap has fewer than k entries.
+        """
+        k = min(k, len(self))
+        if k * 16 < len(self):
+            popped = [self.pop() for _ in range(k)]
+            return (np.array([p for p, _ in popped], dtype=np.float64),
+                    np.array([v for _, v in popped], dtype=np.int64))
+        priorities, values = self._arrays()
+        order = np.argsort(priorities, kind="stable")
+        priorities, values = priorities[order], values[order]
+        self._set_sorted(priorities[k:], values[k:])
+        return priorities[:k], values[:k]
+
+    def __iter__(self):
+        while len(self):
+            yield self.pop()
+
+    def _arrays(self):
+        # numpy views of the priorities and values
+        return (np.frombuffer(self._priority, dtype=np.float64),
+                np.frombuffer(self._value, dtype=np.int64))
+
+    def _set_sorted(self, priorities, values):
+        # sorted arrays are a valid heap as they are
+        self._priority = array('d', priorities.tobytes())
+        self._value = array('q', values.tobytes())
+
+    def _sink(self, i):
+        # as IndexedHeap._sink: shift smaller children up to a leaf, then
+        # swim the entry back up
+        p, v = self._priority, self._value
+        N = len(p)
+        priority, value = p[i], v[i]
+        j = 2*i + 1
+        while j < N:
+            if j + 1 < N and p[j+1] < p[j]:
+                j += 1
+            p[i], v[i] = p[j], v[j]
+            i = j
+            j = 2*i + 1
+        p[i], v[i] = priority, value
+        self._swim(i)
+
+    def _swim(self, i):
+        p, v = self._priority, self._value
+        priority, value = p[i], v[i]
+        while i > 0:
+            j = (i - 1) >> 1
+            if not priority < p[j]:
+                break
+            p[i], v[i] = p[j], v[j]
+            i = j
+        p[i], v[i] = priority, value
+
+
+def _wake_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class PriorityQueue:
+    """Thread-safe priority queue on a Heap, that can also be awaited
+
+    Items come out in Heap order, with its `key` and `reverse` options,
+    and equal keys in the order they were put.
+    `get` and `put` block the calling thread, like queue.Queue, raising
+    queue.Empty and queue.Full on timeouts. `get_async` and `put_async`
+    are coroutines that wait on futures of the caller's event loop, so
+    producers and consumers can be any mix of threads and asyncio tasks.
+    With `maxsize`, puts wait for room.
+
+    The lock is held only for the heap operations themselves: keys are
+    computed before taking it, and `put_many` takes it once for a batch.
+    """
+    def __init__(self, maxsize=0, key=None, reverse=False):
+        self.maxsize = maxsize
+        self._heap = Heap(key=key, reverse=reverse)
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+        self._async_getters = deque()   # (loop, future) of waiting tasks
+        self._async_putters = deque()
+
+    def __len__(self):
+        return len(self._heap)
+
+    qsize = __len__
+
+    def empty(self):
+        return not len(self._heap)
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._heap)
+
+    def put(self, item, block=True, timeout=None):
+        self.put_many([item], block, timeout)
+
+    def put_many(self, items, block=True, timeout=None):
+        """Put a batch of items, taking the lock once if there's room
+
+        If the queue fills up, waits for room for the rest, as `put`. On a
+        timeout, the items before the one that didn't fit have been put.
+        """
+        decorate = self._heap._decorate
+        entries = list(items) if decorate is None else list(map(decorate, items))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        h = self._heap._heap
+        with self._mutex:
+            i = 0
+            while i < len(entries):
+                room = len(entries) - i
+                if self.maxsize > 0:
+                    room = min(room, self.maxsize - len(h))
+                if room <= 0:
+                    self._wait(self._not_full, block, deadline, queue.Full)
+                    continue
+                self._push(entries[i:i+room])
+                i += room
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._mutex:
+            while not len(self._heap):
+                self._wait(self._not_empty, block, deadline, queue.Empty)
+            return self._pop()
+
+    async def get_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._mutex:
+                if len(self._heap):
+                    return self._pop()
+                future = loop.create_future()
+                self._async_getters.append((loop, future))
+            await self._wait_async(self._async_getters, loop, future, self.empty)
+
+    async def put_async(self, item):
+        loop = asyncio.get_running_loop()
+        decorate = self._heap._decorate
+        entry = item if decorate is None else decorate(item)
+        while True:
+            with self._mutex:
+                if not self.full():
+                    self._push([entry])
+                    return
+                future = loop.create_future()
+                self._async_putters.append((loop, future))
+            await self._wait_async(self._async_putters, loop, future, self.full)
+
+    def _push(self, entries):
+        # with the lock held
+        h = self._heap._heap
+        for entry in entries:
+            heapq.heappush(h, entry)
+        self._not_empty.notify(len(entries))
+        self._wake(self._async_getters, len(entries))
+
+    def _pop(self):
+        # with the lock held
+        item = self._heap.pop()
+        self._not_full.notify()
+        self._wake(self._async_putters)
+        return item
+
+    def _wait(self, condition, block, deadline, error):
+        # wait on a condition, with the lock held
+        if not block:
+            raise error
+        if deadline is None:
+            condition.wait()
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not condition.wait(remaining):
+            raise error
+
+    def _wake(self, waiters, n=1):
+        # with the lock held, wake up to n waiting tasks
+        for _ in range(min(n, len(waiters))):
+            loop, future = waiters.popleft()
+            loop.call_soon_threadsafe(_wake_future, future)
+
+    async def _wait_async(self, waiters, loop, future, blocked):
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._mutex:
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                elif not blocked():
+                    self._wake(waiters)  # pass on a wake-up this task got
+            raise
+
+
+def merge(*iterables, key=None, reverse=False):
+    """Return generator of the items of sorted iterables, merged in order
+
+    Each iterable must be sorted by key, or in reverse. The merge is lazy:
+    it holds one item from each input, in a heap, so each item costs
+    O(log k) for k inputs. Equal items come out in the order of their
+    inputs, as from sorted(itertools.chain(*iterables), key=key,
+    reverse=reverse).
+    """
+    return heapq.merge(*iterables, key=key, reverse=reverse)
+
+
+class TopK:
+    """Bounded accumulator of the first k items of a stream, in sorted order
+
+    After pushing items, `result()` is sorted(items, key=key,
+    reverse=reverse)[:k]: the k smallest, or with `reverse` the k largest,
+    the earliest first among equals. Only k items are ever held, in a heap
+    with the next one to drop at the root, so a push is O(log k), and O(1)
+    for an item that doesn't make the cut.
+    """
+    def __init__(self, k, key=None, reverse=False):
+        self.k = k
+        self._key = key
+        self._reverse = reverse
+        self._heap = []
+        self._count = itertools.count()  # ties drop the latest item first
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item):
+        k = self._key(item) if self._key else item
+        seq = next(self._count)
+        # the root is the item that sorts last: largest key, or smallest
+        # with reverse, and the latest of equals
+        if self._reverse:
+            entry = (k, -seq, item)
+        else:
+            entry = _Reversed((k, seq), item)
+        h = self._heap
+        if len(h) < self.k:
+            heapq.heappush(h, entry)
+        elif h and h[0] < entry:
+            heapq.heapreplace(h, entry)
+
+    def push_many(self, items):
+        for item in items:
+            self.push(item)
+
+    def result(self):
+        """Return list of the items held, in sorted order"""
+        entries = sorted(self._heap, reverse=True)
+        if self._reverse:
+            return [entry[2] for entry in entries]
+        return [entry.item for entry in entries]
+
+
 class TestHeap(unittest.TestCase):
     def test_length(self):
         h = Heap()
@@ -83,6 +619,73 @@ class TestHeap(unittest.TestCase):
         a = h.pop()
         self.assertEqual(a, "A")
 
+    def test_pop_in_place(self):
+        h = Heap()
+        for c in "DACB":
+            h.insert(c)
+        backing = h._heap
+        self.assertEqual([h.pop() for _ in range(4)], list("ABCD"))
+        self.assertIs(h._heap, backing)
+        self.assertIsNone(h.pop())
+
+    def test_from_iterable(self):
+        import random
+        items = [random.randrange(1000) for _ in range(1000)]
+        h = Heap.from_iterable(items)
+        self.assertEqual(len(h), 1000)
+        self.assertEqual(list(h), sorted(items))
+        self.assertEqual(list(Heap.from_iterable([])), [])
+
+        class MaxHeap(Heap):
+            def compare(self, a, b):
+                return self._heap[a] > self._heap[b]
+        h = MaxHeap.from_iterable(iter(items))
+        self.assertIsInstance(h, MaxHeap)
+        self.assertEqual(list(h), sorted(items, reverse=True))
+
+    def test_key_reverse(self):
+        words = ["pear", "fig", "banana", "kiwi", "apple", "date"]
+        self.assertEqual(list(Heap.from_iterable(words, key=len)),
+                         sorted(words, key=len))
+        self.assertEqual(list(Heap.from_iterable(words, reverse=True)),
+                         sorted(words, reverse=True))
+        h = Heap(key=len, reverse=True)
+        for w in words:
+            h.insert(w)
+        self.assertEqual(len(h[0]), 6)
+        self.assertEqual([len(w) for w in h], sorted(map(len, words), reverse=True))
+        # ties come out in insertion order, with reverse too
+        self.assertEqual(list(Heap.from_iterable(words, key=len, reverse=True)),
+                         sorted(words, key=len, reverse=True))
+        h = Heap(key=len, reverse=True)
+        for w in words:
+            h.insert(w)
+        self.assertEqual(list(h), sorted(words, key=len, reverse=True))
+
+        # numeric keys are negated, so comparisons stay in C; others fall back
+        h = Heap.from_iterable([3, 1.5, 2, 3], reverse=True)
+        self.assertIsInstance(h._heap[0], tuple)
+        self.assertEqual(list(h), [3, 3, 2, 1.5])
+        h = Heap.from_iterable(words, reverse=True)
+        self.assertIsInstance(h._heap[0], _Reversed)
+        self.assertEqual(list(h), sorted(words, reverse=True))
+
+        # items themselves are never compared
+        h = Heap(key=lambda item: item["priority"])
+        for p in [3, 1, 2, 1]:
+            h.insert({"priority": p})
+        self.assertEqual([item["priority"] for item in h], [1, 1, 2, 3])
+
+    def test_compare_override(self):
+        class MaxHeap(Heap):
+            def compare(self, a, b):
+                return self._heap[a] > self._heap[b]
+        h = MaxHeap()
+        for c in "DACEB":
+            h.insert(c)
+        self.assertEqual(h[0], "E")
+        self.assertEqual(''.join(h), "EDCBA")
+
     def test_generator(self):
         import random
         h = Heap()
@@ -102,6 +705,225 @@ class TestHeap(unittest.TestCase):
         self.assertEqual(input, ''.join(res))
 
 
+class TestIndexedHeap(unittest.TestCase):
+    def test_pop_order(self):
+        import random
+        h = IndexedHeap()
+        priorities = list(range(100))
+        random.shuffle(priorities)
+        for item, priority in enumerate(priorities):
+            h.insert(item, priority)
+        self.assertEqual(len(h), 100)
+        self.assertEqual(h.peek(), (priorities.index(0), 0))
+        res = [h.pop() for _ in range(100)]
+        self.assertEqual([p for _, p in res], sorted(priorities))
+        self.assertEqual([priorities[i] for i, _ in res], sorted(priorities))
+        self.assertIsNone(h.pop())
+        self.assertIsNone(h.peek())
+
+    def test_decrease_key(self):
+        h = IndexedHeap()
+        for c in "ABCDE":
+            h.insert(c, ord(c))
+        h.decrease_key("D", 0)
+        self.assertEqual(h.priority("D"), 0)
+        self.assertIn("D", h)
+        self.assertEqual(h.pop(), ("D", 0))
+        self.assertNotIn("D", h)
+        self.assertEqual(''.join(item for item, _ in iter(h.pop, None)), "ABCE")
+
+    def test_increase_key_update(self):
+        h = IndexedHeap()
+        for c in "ABCDE":
+            h.insert(c, ord(c))
+        h.increase_key("A", 100)
+        h.update("E", 0)
+        h.update("C", 90)
+        h.update("F", 80)
+        self.assertEqual([item for item, _ in h], list("EBDFCA"))
+        self.assertEqual(len(h), 0)
+
+    def test_remove(self):
+        import random
+        h = IndexedHeap()
+        priorities = {item: random.random() for item in range(200)}
+        for item, priority in priorities.items():
+            h.insert(item, priority)
+        for item in random.sample(range(200), 100):
+            self.assertEqual(h.remove(item), priorities.pop(item))
+            self.assertNotIn(item, h)
+        self.assertEqual(list(h), sorted(priorities.items(), key=lambda x: x[1]))
+        with self.assertRaises(KeyError):
+            h.remove(0)
+
+    def test_errors(self):
+        h = IndexedHeap()
+        h.insert("A", 1)
+        with self.assertRaises(KeyError):
+            h.insert("A", 2)
+        with self.assertRaises(ValueError):
+            h.decrease_key("A", 2)
+        with self.assertRaises(ValueError):
+            h.increase_key("A", 0)
+        with self.assertRaises(KeyError):
+            h.decrease_key("B", 0)
+
+
+class TestNumericHeap(unittest.TestCase):
+    def test_insert_pop(self):
+        import random
+        h = NumericHeap()
+        pairs = [(random.random(), i) for i in range(500)]
+        for priority, value in pairs:
+            h.insert(priority, value)
+        self.assertEqual(len(h), 500)
+        self.assertEqual(list(h), sorted(pairs))
+        self.assertIsNone(h.pop())
+
+    def test_batches(self):
+        rng = np.random.default_rng(0)
+        h = NumericHeap()
+        expect = []
+        # large batches are sorted in, small ones inserted one by one,
+        # and likewise popped
+        for size in [1000, 10, 3000, 5, 0, 50]:
+            priorities = rng.random(size)
+            values = rng.integers(0, 2**40, size)
+            h.push_many(priorities, values)
+            expect.extend(zip(priorities.tolist(), values.tolist()))
+            expect.sort()
+            for k in [5, 2000]:
+                p, v = h.pop_many(k)
+                self.assertEqual(p.dtype, np.float64)
+                self.assertEqual(list(zip(p.tolist(), v.tolist())), expect[:k])
+                expect = expect[k:]
+                self.assertEqual(len(h), len(expect))
+        h.push_many([2.0, 1.0])
+        self.assertEqual(list(h), [(1.0, 0), (2.0, 0)])
+        with self.assertRaises(ValueError):
+            h.push_many([1.0], [1, 2])
+
+
+class TestPriorityQueue(unittest.TestCase):
+    def test_order(self):
+        q = PriorityQueue(key=len, reverse=True)
+        q.put_many(["fig", "banana", "kiwi"])
+        q.put("apple")
+        self.assertEqual(len(q), 4)
+        self.assertEqual([q.get() for _ in range(4)], ["banana", "apple", "kiwi", "fig"])
+        q.put_many(["pear", "kiwi", "date", "fig"])
+        self.assertEqual([q.get() for _ in range(4)], ["pear", "kiwi", "date", "fig"])
+        self.assertTrue(q.empty())
+
+    def test_timeouts(self):
+        q = PriorityQueue(maxsize=2)
+        with self.assertRaises(queue.Empty):
+            q.get(block=False)
+        with self.assertRaises(queue.Empty):
+            q.get(timeout=0.01)
+        with self.assertRaises(queue.Full):
+            q.put_many([3, 2, 1], timeout=0.01)
+        self.assertTrue(q.full())
+        self.assertEqual([q.get(), q.get()], [2, 3])
+
+    def test_threads(self):
+        q = PriorityQueue(maxsize=10)
+        got = []
+
+        def produce(start):
+            for i in range(start, start + 500, 5):
+                q.put_many(range(i, i + 5))
+
+        def consume():
+            while True:
+                item = q.get()
+                if item == float("inf"):
+                    return
+                got.append(item)
+
+        producers = [threading.Thread(target=produce, args=(i * 500,)) for i in range(4)]
+        consumers = [threading.Thread(target=consume) for _ in range(3)]
+        for t in producers + consumers:
+            t.start()
+        for t in producers:
+            t.join()
+        for _ in consumers:
+            q.put(float("inf"), timeout=10)
+        for t in consumers:
+            t.join()
+        self.assertEqual(sorted(got), list(range(2000)))
+
+    def test_async(self):
+        q = PriorityQueue(maxsize=3)
+
+        async def main():
+            # a thread feeds tasks, which feed a bounded queue back to it
+            results = PriorityQueue()
+            feeder = threading.Thread(target=q.put_many, args=(range(20),))
+            feeder.start()
+            got = [await q.get_async() for _ in range(20)]
+            feeder.join()
+            for i in range(5):
+                await results.put_async(i)
+            waiter = asyncio.ensure_future(q.get_async())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            for i in range(3):
+                await q.put_async(i)
+            blocked = asyncio.ensure_future(q.put_async(3))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            self.assertEqual(await asyncio.to_thread(q.get), 0)
+            await asyncio.wait_for(blocked, 1)
+            return got, [results.get() for _ in range(5)]
+
+        got, results = asyncio.run(main())
+        self.assertEqual(sorted(got), list(range(20)))
+        self.assertEqual(results, list(range(5)))
+        self.assertEqual([q.get() for _ in range(3)], [1, 2, 3])
+
+
+class TestMerge(unittest.TestCase):
+    def test_merge(self):
+        import random
+        runs = [sorted(random.randrange(50) for _ in range(random.randrange(30)))
+                for _ in range(8)]
+        self.assertEqual(list(merge(*runs)), sorted(itertools.chain(*runs)))
+        self.assertEqual(list(merge()), [])
+
+        pairs = [sorted(((random.randrange(10), i) for _ in range(20)), key=lambda p: p[0])
+                 for i in range(5)]
+        expect = sorted(itertools.chain(*pairs), key=lambda p: p[0])
+        self.assertEqual(list(merge(*pairs, key=lambda p: p[0])), expect)
+        pairs = [run[::-1] for run in pairs]
+        expect = sorted(itertools.chain(*pairs), key=lambda p: p[0], reverse=True)
+        self.assertEqual(list(merge(*pairs, key=lambda p: p[0], reverse=True)), expect)
+
+    def test_merge_lazy(self):
+        evens = itertools.count(0, 2)
+        odds = itertools.count(1, 2)
+        self.assertEqual(list(itertools.islice(merge(evens, odds), 10)), list(range(10)))
+
+
+class TestTopK(unittest.TestCase):
+    def test_top_k(self):
+        import random
+        items = [(random.randrange(20), i) for i in range(500)]
+        for k in [0, 1, 10, 1000]:
+            for reverse in [False, True]:
+                top = TopK(k, key=lambda p: p[0], reverse=reverse)
+                top.push_many(items)
+                self.assertLessEqual(len(top), k)
+                self.assertEqual(top.result(),
+                                 sorted(items, key=lambda p: p[0], reverse=reverse)[:k])
+
+        top = TopK(3, reverse=True)
+        top.push_many("heapsort")
+        self.assertEqual(top.result(), ["t", "s", "r"])
+
+
 def main():
     unittest.main()
 
@@ -0,0 +1,379 @@
+"""Tests for Conway's Game of Life engines
+
+Every engine should produce the same generations as the reference
+list-of-lists generators, `game_of_life` (dead edges) and
+`game_of_life_wraparound` (torus).
+"""
+import contextlib
+import io
+import itertools
+
+import hypothesis.extra.numpy as hyp_np
+import hypothesis.strategies as st
+import numpy as np
+import pytest
+from hypothesis import given, settings
+
+import conway
+import conway_io
+import conway_tiled
+import hashlife
+
+
+def generations(game, n):
+    """Return the first n generations of game as 0/1 numpy arrays"""
+    return [np.array(g, dtype=np.uint8) for g in itertools.islice(game, n)]
+
+
+def packed_engine(wraparound):
+    def run(board):
+        ncols = len(board[0])
+        for packed in conway.game_of_life_numpy(board, wraparound, packed=True):
+            yield conway.unpack_board(packed, ncols)
+    return run
+
+
+# add engines here: name -> (generator function, reference generator function)
+engines = {
+    "numpy": (conway.game_of_life_numpy, conway.game_of_life),
+    "numpy, wraparound": (
+        lambda board: conway.game_of_life_numpy(board, wraparound=True),
+        conway.game_of_life_wraparound,
+    ),
+    "numpy packed": (packed_engine(False), conway.game_of_life),
+    "numpy packed, wraparound": (packed_engine(True), conway.game_of_life_wraparound),
+}
+
+
+@pytest.fixture(scope="session", params=engines.values(), ids=engines.keys())
+def engine(request):
+    """Pairs of (engine, reference engine) to compare"""
+    return request.param
+
+
+## Simple cases
+## ============
+
+def test_blinker_oscillates(engine):
+    game, _ = engine
+    first, second, third = generations(game(conway.blinker), 3)
+    assert (first == np.array(conway.blinker)).all()
+    assert (second == first.T).all()
+    assert (third == first).all()
+
+
+def test_glider_moves_diagonally(engine):
+    game, _ = engine
+    board = conway.edgepad_board(conway.glider, right=4, bottom=4)
+    gens = generations(game(board), 5)
+    assert (np.roll(gens[0], (1, 1), axis=(0, 1)) == gens[4]).all()
+
+
+def test_empty_board_stays_empty(engine):
+    game, _ = engine
+    for g in generations(game(conway.block), 3):
+        assert not g.any()
+
+
+## Properties
+## ==========
+
+st_board = hyp_np.arrays(
+    dtype=np.uint8,
+    shape=hyp_np.array_shapes(min_dims=2, max_dims=2, min_side=1, max_side=70),
+    elements=st.integers(0, 1),
+)
+st_small_board = hyp_np.arrays(
+    dtype=np.uint8,
+    shape=hyp_np.array_shapes(min_dims=2, max_dims=2, min_side=1, max_side=16),
+    elements=st.integers(0, 1),
+)
+
+
+@settings(max_examples=50, deadline=None)
+@given(board=st_board)
+def test_matches_reference(board, engine):
+    game, reference = engine
+    board = board.tolist()
+    for actual, expected in zip(generations(game(board), 4),
+                                generations(reference(board), 4)):
+        assert (actual == expected).all()
+
+
+## Rules
+## =====
+
+other_rules = [conway.HIGHLIFE, conway.DAY_AND_NIGHT, conway.SEEDS, "B0123/S4"]
+
+
+@pytest.mark.parametrize("rule", other_rules)
+@pytest.mark.parametrize("wraparound", [False, True], ids=["edges", "wraparound"])
+@settings(max_examples=20, deadline=None)
+@given(board=st_board)
+def test_numpy_rules_match_reference(board, wraparound, rule):
+    board = board.tolist()
+    ncols = len(board[0])
+    reference = conway.game_of_life_wraparound if wraparound else conway.game_of_life
+    expected = generations(reference(board, rule=rule), 4)
+    actual = generations(conway.game_of_life_numpy(board, wraparound, rule=rule), 4)
+    packed = conway.game_of_life_numpy(board, wraparound, packed=True, rule=rule)
+    for a, p, e in zip(actual, itertools.islice(packed, 4), expected):
+        assert (a == e).all()
+        assert (conway.unpack_board(p, ncols) == e).all()
+
+
+@pytest.mark.parametrize("rule", other_rules[:3])
+@settings(max_examples=10, deadline=None)
+@given(board=st_small_board)
+def test_unbounded_rules_match_reference(board, rule):
+    board = conway.edgepad_board(board.tolist(), 8, 8, 8, 8)
+    height, width = len(board), len(board[0])
+    expected = generations(conway.game_of_life_numpy(board, rule=rule), 9)
+    sparse = itertools.islice(conway.game_of_life_sparse(board, rule=rule), 9)
+    for cells, gen in zip(sparse, expected):
+        assert (np.array(conway.cells_to_board(cells, 0, 0, height, width)) == gen).all()
+    life = hashlife.HashLife(board, rule=rule)
+    life.advance(8)
+    assert (np.array(life.to_board()) == expected[8]).all()
+
+
+def test_parse_rule():
+    assert conway.parse_rule("B3/S23") == ({3}, {2, 3})
+    assert conway.parse_rule("s23/b3") == ({3}, {2, 3})
+    assert conway.parse_rule(conway.SEEDS) == ({2}, set())
+    for rule in ["B9/S23", "B3S23", "life", ""]:
+        with pytest.raises(ValueError):
+            conway.parse_rule(rule)
+
+
+def test_unbounded_rejects_birth_on_zero():
+    with pytest.raises(ValueError):
+        next(conway.game_of_life_sparse(conway.glider, rule="B0/S"))
+    with pytest.raises(ValueError):
+        hashlife.HashLife(conway.glider, rule="B0/S")
+
+
+## Hashlife
+## ========
+# the plane is unbounded, so compare against boards with enough dead
+# padding that nothing reaches the edges
+
+@settings(max_examples=20, deadline=None)
+@given(board=st_small_board)
+def test_hashlife_matches_reference(board):
+    board = conway.edgepad_board(board.tolist(), 16, 16, 16, 16)
+    expected = generations(conway.game_of_life_numpy(board), 17)
+
+    stepped = hashlife.HashLife(board)
+    for gen in range(1, 17):
+        stepped.advance(1)
+        assert (np.array(stepped.to_board()) == expected[gen]).all()
+
+    leapt = hashlife.HashLife(board)
+    leapt.step(4)
+    assert leapt.generation == 16
+    assert (np.array(leapt.to_board()) == expected[16]).all()
+
+
+def test_hashlife_glider_far_future():
+    life = hashlife.HashLife(conway.glider)
+    life.advance(4 * 10**9)
+    assert life.population == 5
+    assert life.to_board(top=10**9, left=10**9) == conway.glider
+
+
+def test_hashlife_collect_bounds_nodes():
+    board = conway.edgepad_board(conway.random_board(12, 12), 20, 20, 20, 20)
+    expected = generations(conway.game_of_life_numpy(board), 17)[16]
+    life = hashlife.HashLife(board, max_nodes=100)
+    for _ in range(4):
+        life.step(2)
+        nodes = len(life)
+        life.collect()
+        # either under the bound, or already down to the live nodes
+        assert nodes <= 100 or nodes == len(life)
+    assert (np.array(life.to_board()) == expected).all()
+
+
+## Sparse
+## ======
+
+@settings(max_examples=20, deadline=None)
+@given(board=st_small_board)
+def test_sparse_matches_reference(board):
+    board = conway.edgepad_board(board.tolist(), 8, 8, 8, 8)
+    height, width = len(board), len(board[0])
+    expected = generations(conway.game_of_life_numpy(board), 9)
+    actual = itertools.islice(conway.game_of_life_sparse(board), 9)
+    for cells, gen in zip(actual, expected):
+        assert (np.array(conway.cells_to_board(cells, 0, 0, height, width)) == gen).all()
+
+
+def test_sparse_glider_leaves_board():
+    gens = list(itertools.islice(conway.game_of_life_sparse(conway.glider), 401))
+    assert gens[-1] == {(i + 100, j + 100) for i, j in conway.board_to_cells(conway.glider)}
+    assert conway.cells_to_board(gens[-1]) == conway.cells_to_board(gens[0])
+
+
+def test_sparse_in_place():
+    game = conway.game_of_life_sparse(conway.blinker, copy=False)
+    first = next(game)
+    expected = conway.board_to_cells(conway.game_of_life(conway.blinker).__next__())
+    assert first == expected
+    second = next(game)
+    assert second is first
+    assert second != expected
+    assert next(game) == expected
+
+
+def test_sparse_accepts_cells():
+    cells = conway.board_to_cells(conway.blinker, top=-100, left=-100)
+    game = conway.game_of_life_sparse(cells)
+    assert next(game) == cells
+    assert next(game) == {(-98, -99), (-98, -98), (-98, -97)}
+
+
+## Tiled
+## =====
+
+@pytest.mark.parametrize("wraparound", [False, True], ids=["edges", "wraparound"])
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("rule", [conway.CONWAY, conway.HIGHLIFE])
+def test_tiled_matches_reference(workers, wraparound, rule):
+    board = conway.random_board(23, 17)
+    expected = generations(conway.game_of_life_numpy(board, wraparound, rule=rule), 6)
+    tiled = conway_tiled.game_of_life_tiled(board, workers, wraparound, rule)
+    with contextlib.closing(tiled) as game:
+        actual = generations(game, 6)
+    for a, e in zip(actual, expected):
+        assert (a == e).all()
+
+
+## Cycles
+## ======
+
+def test_find_cycle_oscillator(engine):
+    game, _ = engine
+    assert conway.find_cycle(game(conway.blinker)) == conway.Cycle(0, 2)
+    assert conway.find_cycle(game(conway.block)) == conway.Cycle(0, 1)
+
+
+def test_find_cycle_glider_on_torus():
+    board = conway.edgepad_board(conway.glider, left=0, right=2, top=0, bottom=2)
+    game = conway.game_of_life_numpy(board, wraparound=True)
+    assert conway.find_cycle(game) == conway.Cycle(0, 32)
+
+    game = conway.game_of_life_numpy(board, wraparound=True)
+    assert conway.find_cycle(game, max_generations=100, history=31) is None
+
+
+def test_find_cycle_sparse():
+    board = conway.edgepad_board(conway.beacon, 2, 2, 2, 2)
+    assert conway.find_cycle(conway.game_of_life_sparse(board)) == conway.Cycle(0, 2)
+    assert conway.find_cycle(conway.game_of_life_sparse(conway.glider), 100) is None
+
+
+@settings(max_examples=20, deadline=None)
+@given(board=st_small_board)
+def test_until_cycle_stops_at_repeat(board):
+    board = board.tolist()
+    gens = conway.until_cycle(conway.game_of_life_wraparound(board))
+    seen = []
+    try:
+        while True:
+            seen.append(np.array(next(gens)))
+    except StopIteration as stop:
+        cycle = stop.value
+    repeat = next(itertools.islice(conway.game_of_life_wraparound(board), len(seen), None))
+    assert (np.array(repeat) == seen[cycle.start]).all()
+    assert len(seen) == cycle.start + cycle.period
+    assert cycle == conway.find_cycle(conway.game_of_life_numpy(board, wraparound=True))
+
+
+## Pattern I/O
+## ===========
+
+glider_rle = """#N Glider
+x = 3, y = 3, rule = B3/S23
+bo$2bo$
+3o!
+"""
+
+
+def test_read_rle():
+    board, rule = conway_io.read_rle(io.StringIO(glider_rle))
+    assert board.tolist() == [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    assert rule == conway.CONWAY
+
+    packed, _ = conway_io.read_rle(io.StringIO(glider_rle), packed=True)
+    assert (conway.unpack_board(packed, 3) == board).all()
+
+
+@pytest.mark.parametrize("engine", ["list", "wraparound", "numpy", "sparse", "hashlife"])
+def test_read_rle_runs_in_engines(engine):
+    board, rule = conway_io.read_rle(io.StringIO(
+        "x = 5, y = 5, rule = B3/S23\n5b$5b$b3o$5b$5b!"))
+    expected = np.zeros((5, 5), dtype=np.uint8)
+    expected[1:4, 2] = 1
+    if engine == "hashlife":
+        life = hashlife.HashLife(board, rule=rule)
+        life.advance(1)
+        actual = life.to_board()
+    else:
+        game = {"list": conway.game_of_life,
+                "wraparound": conway.game_of_life_wraparound,
+                "numpy": conway.game_of_life_numpy,
+                "sparse": conway.game_of_life_sparse}[engine](board, rule=rule)
+        next(game)
+        actual = next(game)
+        if engine == "sparse":
+            actual = conway.cells_to_board(actual, 0, 0, 5, 5)
+    assert (np.array(actual) == expected).all()
+
+
+def test_read_rle_errors():
+    for text in ["bo$2bo$3o!", "x = 2, y = 3\nbo$2bo$3o!", "x = 3, y = 2\nbo$2bo$3o!",
+                 "x = 3, y = 3\nbo$2bo$3o"]:
+        with pytest.raises(ValueError):
+            conway_io.read_rle(io.StringIO(text))
+
+
+@settings(max_examples=50, deadline=None)
+@given(board=st_board)
+def test_rle_roundtrip(board):
+    f = io.StringIO()
+    conway_io.write_rle(board, f, rule=conway.HIGHLIFE, width=20)
+    assert all(len(line) <= 70 for line in f.getvalue().splitlines()[1:])
+    f.seek(0)
+    actual, rule = conway_io.read_rle(f)
+    assert (actual == board).all()
+    assert rule == conway.HIGHLIFE
+
+
+@settings(max_examples=20, deadline=None)
+@given(board=st_board)
+def test_plaintext_roundtrip(board):
+    f = io.StringIO()
+    conway_io.write_plaintext(board, f)
+    f.seek(0)
+    assert (conway_io.read_plaintext(f) == board).all()
+
+
+def test_read_plaintext_ragged():
+    f = io.StringIO("!Name: Blinker\n.O\n.O\n.O.\n")
+    assert conway_io.read_plaintext(f).tolist() == [[0, 1, 0], [0, 1, 0], [0, 1, 0]]
+
+
+@settings(max_examples=20, deadline=None)
+@given(board=st_board)
+def test_packed_roundtrip(board, tmp_path_factory):
+    path = tmp_path_factory.mktemp("packed") / "board.lifepack"
+    conway_io.save_packed(board, path, chunk_rows=3)
+    packed, ncols = conway_io.load_packed(path)
+    assert ncols == board.shape[1]
+    assert (conway.unpack_board(packed, ncols) == board).all()
+
+    expected = generations(conway.game_of_life_numpy(board), 3)
+    actual = conway.game_of_life_numpy(packed, ncols=ncols)
+    for p, e in zip(itertools.islice(actual, 3), expected):
+        assert (conway.unpack_board(p, ncols) == e).all()